@@ -0,0 +1,112 @@
+/*
+    Chunked, resumable upload of waypoint .dat files through the /upload routes
+    (helpers/upload_helpers.py), instead of base64 encoding the whole file in the
+    browser. The file is sent one chunk at a time straight from disk; the upload id
+    is remembered per file so picking the same file again after a failure resumes
+    where it stopped. Once the file is in the data directory, the hidden
+    uploaded-filename input is set, which triggers update_memory_data.
+*/
+(function() {
+    const RESUME_KEY_PREFIX = 'contrail-upload:';
+    const MAX_CHUNK_ATTEMPTS = 3;
+
+    function setStatus(text) {
+        const status = document.getElementById('upload-status');
+        if (status) {
+            status.textContent = text;
+        }
+    }
+
+    // dcc.Input is a React controlled input, its value has to go through the native
+    // setter and an input event for Dash to pick it up
+    function setUploadedFilename(filename) {
+        const input = document.getElementById('uploaded-filename');
+        const setValue = Object.getOwnPropertyDescriptor(window.HTMLInputElement.prototype, 'value').set;
+        setValue.call(input, JSON.stringify({filename: filename, uploaded: Date.now()}));
+        input.dispatchEvent(new Event('input', {bubbles: true}));
+    }
+
+    async function responseJson(response) {
+        const result = await response.json();
+        if (!response.ok && response.status !== 409) {
+            throw new Error(result.error);
+        }
+        return result;
+    }
+
+    async function startOrResumeUpload(file) {
+        const resumeKey = RESUME_KEY_PREFIX + [file.name, file.size, file.lastModified].join(':');
+
+        const uploadId = window.localStorage.getItem(resumeKey);
+        if (uploadId) {
+            const response = await fetch('/upload/' + uploadId);
+            if (response.ok) {
+                return Object.assign({resumeKey: resumeKey}, await response.json());
+            }
+            window.localStorage.removeItem(resumeKey);
+        }
+
+        const upload = await responseJson(await fetch('/upload', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({filename: file.name, size: file.size})
+        }));
+        window.localStorage.setItem(resumeKey, upload.upload_id);
+        return Object.assign({resumeKey: resumeKey}, upload);
+    }
+
+    async function putChunk(upload, file, offset) {
+        for (let attempt = 1; ; attempt++) {
+            try {
+                const response = await fetch('/upload/' + upload.upload_id + '?offset=' + offset, {
+                    method: 'PUT',
+                    headers: {'Content-Type': 'application/octet-stream'},
+                    body: file.slice(offset, offset + upload.chunk_size)
+                });
+                // 409: the server has a different number of bytes, carry on from there
+                return (await responseJson(response)).offset;
+            } catch (error) {
+                if (attempt >= MAX_CHUNK_ATTEMPTS || !(error instanceof TypeError)) {
+                    throw error;
+                }
+            }
+        }
+    }
+
+    async function uploadFile(file) {
+        const upload = await startOrResumeUpload(file);
+
+        let offset = upload.offset;
+        while (offset < file.size) {
+            setStatus('Uploading ' + file.name + ': ' + Math.floor(100 * offset / file.size) + '%');
+            offset = await putChunk(upload, file, offset);
+        }
+
+        setStatus('Uploading ' + file.name + ': 100%');
+        window.localStorage.removeItem(upload.resumeKey);
+        const result = await responseJson(await fetch('/upload/' + upload.upload_id + '/complete', {method: 'POST'}));
+        return result.filename;
+    }
+
+    document.addEventListener('click', function(event) {
+        if (event.target.closest('#load-waypoints-button')) {
+            document.getElementById('load-waypoints-input').click();
+        }
+    });
+
+    document.addEventListener('change', async function(event) {
+        if (event.target.id !== 'load-waypoints-input' || !event.target.files.length) {
+            return;
+        }
+        const file = event.target.files[0];
+        // picking the same file again must fire another change event
+        event.target.value = '';
+
+        try {
+            setUploadedFilename(await uploadFile(file));
+            setStatus('');
+        } catch (error) {
+            setStatus('Upload of ' + file.name + ' failed: ' + error.message);
+        }
+    });
+})();
@@ -0,0 +1,42 @@
+/*
+    Moves the markers of the slider graphs to the time selected with the slider,
+    entirely in the browser. update_graphs_with_sliders stores the marker position of
+    every trace at every slider step in the slider-frames store once per table change;
+    here only those traces are restyled, the graphs are not sent again.
+*/
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    slider: {
+        move_markers: function(t_value, frames) {
+            if (!frames || !frames.figures) {
+                return 'Time: ';
+            }
+
+            const step = Math.round(t_value - frames.t_min);
+            for (const [graphId, markers] of Object.entries(frames.figures)) {
+                const graph = document.getElementById(graphId);
+                const plot = graph && graph.querySelector('.js-plotly-plot');
+                if (!plot || !plot.data || !window.Plotly) {
+                    continue;
+                }
+
+                const update = {};
+                for (const axis of ['x', 'y', 'z']) {
+                    if (axis in markers[0]) {
+                        update[axis] = markers.map(function(marker) {
+                            const value = marker[axis][step];
+                            return value === null || value === undefined ? [] : [value];
+                        });
+                    }
+                }
+
+                try {
+                    window.Plotly.restyle(plot, update, markers.map(function(marker) { return marker.trace; }));
+                } catch (error) {
+                    // the graph is being replaced by the figures of a new table
+                }
+            }
+
+            return 'Time: ' + t_value + 's';
+        }
+    }
+});
@@ -0,0 +1,78 @@
+import sys
+import threading
+import collections
+import numpy as np
+
+'''
+    Approximate number of bytes held by value. NumPy arrays count their buffers,
+    containers are summed recursively.
+'''
+def nbytes_of(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(nbytes_of(k) + nbytes_of(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(nbytes_of(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class LRUByteCache:
+    '''
+        Thread-safe least recently used mapping whose total size is bounded by
+        max_bytes rather than by a number of entries. Putting a value evicts the
+        least recently used entries until everything fits again; a single value
+        larger than max_bytes is not kept at all.
+    '''
+    def __init__(self, max_bytes, sizeof=nbytes_of):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._sizeof = sizeof
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, key, value, nbytes=None):
+        nbytes = self._sizeof(value) if nbytes is None else nbytes
+
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)[1]
+            if nbytes > self.max_bytes:
+                return False
+
+            self._entries[key] = (value, nbytes)
+            self.total_bytes += nbytes
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted_nbytes) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_nbytes
+        return True
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            value, nbytes = self._entries.pop(key)
+            self.total_bytes -= nbytes
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
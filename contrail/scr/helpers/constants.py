@@ -1,8 +1,12 @@
+import os
+import numpy as np
+
 M_TO_NM = 0.000539957; NM_TO_M = 1/M_TO_NM
 FT_TO_M = .3048; M_TO_FT = 1/FT_TO_M
 FT_TO_NM = FT_TO_M*M_TO_NM
 NM_TO_FT = 1/FT_TO_NM 
 MB = 1000000
+GB = 1000 * MB
 
 COLOR_LIST = ['blue', 'orange', 'green', 'red', 'black', 'purple']
 
@@ -14,6 +18,72 @@ NUM_UPDATE_BYTE_SIZE = 2
 INFO_BYTE_SIZE = 4
 WAYPOINT_BYTE_SIZE = 8
 
+# binary layout of the pieces of an encounter block in a waypoints .dat file
+INITIAL_DTYPE = np.dtype([('xEast', '<f8'), ('yNorth', '<f8'), ('zUp', '<f8')])
+NUM_UPDATE_DTYPE = np.dtype('<u2')
+UPDATE_DTYPE = np.dtype([('time', '<f8'), ('xEast', '<f8'), ('yNorth', '<f8'), ('zUp', '<f8')])
+
+INDEX_CHUNK_BYTE_SIZE = 64 * MB
+DATASET_REGISTRY_BYTE_SIZE = 512 * MB
+KERNEL_CACHE_BYTE_SIZE = 256 * MB
+
+SAMPLE_BATCH_SIZE = 10000
+GENERATION_CHUNK_SIZE = 10000
+# encounters per parallel generation shard, a multiple of GENERATION_CHUNK_SIZE
+GENERATION_SHARD_SIZE = 100000
+SEGMENT_COPY_BYTE_SIZE = 16 * MB
+EXPORT_CHUNK_BYTE_SIZE = 16 * MB
+HISTOGRAM_CHUNK_SIZE = 10000
+# resampled trajectories of whole sets, seconds between two samples and encounters per chunk
+RESAMPLE_TIME_STEP = 1.
+RESAMPLE_CHUNK_SIZE = 10000
+# closest point of approach metrics, encounters per parallel shard (a multiple of RESAMPLE_CHUNK_SIZE)
+CPA_SHARD_SIZE = 100000
+CPA_METRICS_CACHE_BYTE_SIZE = 256 * MB
+CPA_METRICS_PAGE_SIZE = 20
+# near mid-air collision: closer than both at the same time, in NM and ft
+NMAC_HORIZONTAL_DISTANCE = 500 * FT_TO_NM
+NMAC_VERTICAL_DISTANCE = 100
+COVARIANCE_JITTERS = [1e-10, 1e-8, 1e-6]
+PROJECTION_CACHE_BYTE_SIZE = 1 * MB
+ENCOUNTER_CACHE_BYTE_SIZE = 256 * MB
+# encounters decoded ahead on either side of the selected one
+ENCOUNTER_PREFETCH_RADIUS = 2
+
+# application executor, 'process' or 'thread' pool of EXECUTOR_MAX_WORKERS workers
+EXECUTOR_KIND = 'process'
+EXECUTOR_MAX_WORKERS = os.cpu_count() or 1
+
+# background jobs
+JOB_DIRECTORY = DEFAULT_DATA_FILE_PATH + 'jobs/'
+JOB_MAX_RUNNING = 2
+# seconds between two looks of an idle job worker for jobs queued by other server processes
+JOB_QUEUE_POLL_INTERVAL = 1.
+# seconds between two progress updates of a job
+JOB_PROGRESS_INTERVAL = 0.5
+# milliseconds between two polls of the status of a job
+JOB_POLL_INTERVAL = 1000
+
+# per job output files (generated sets), evicted least recently used
+# first once together they take more than WORKSPACE_QUOTA_BYTE_SIZE
+WORKSPACE_DIRNAME = 'workspace/'
+WORKSPACE_DIRECTORY = DEFAULT_DATA_FILE_PATH + WORKSPACE_DIRNAME
+WORKSPACE_QUOTA_BYTE_SIZE = 50 * GB
+# seconds after which a partial file no job is writing anymore is removed
+WORKSPACE_PARTIAL_MAX_AGE = 24 * 60 * 60
+
+# chunked .dat uploads, parts are kept in UPLOAD_DIRECTORY until they are complete
+UPLOAD_DIRECTORY = DEFAULT_DATA_FILE_PATH + 'uploads/'
+UPLOAD_CHUNK_BYTE_SIZE = 8 * MB
+# seconds after which an upload that has not received a chunk is dropped
+UPLOAD_MAX_IDLE = 24 * 60 * 60
+
+# streamed .dat downloads, EXPORT_DIRECTORY only holds the small spec of each download
+EXPORT_DIRECTORY = DEFAULT_DATA_FILE_PATH + 'exports/'
+EXPORT_MAX_AGE = 24 * 60 * 60
+
 STANDARD_NUM_PARTITIONS = 3
 
-NUM_BINS_HISTOGRAM = 70
\ No newline at end of file
+NUM_BINS_HISTOGRAM = 70
+# histogram edges of a generated set span the nominal path +/- this many standard deviations
+HISTOGRAM_SIGMA_RANGE = 6
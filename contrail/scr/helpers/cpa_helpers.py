@@ -0,0 +1,224 @@
+import re
+import time
+import itertools
+import concurrent.futures
+import numpy as np
+import pandas as pd
+
+from helpers.constants import *
+from helpers.cache_helpers import *
+from helpers.resample_helpers import *
+from helpers.executor_helpers import *
+from helpers.job_helpers import *
+from helpers.workspace_helpers import *
+
+'''
+    Closest point of approach (CPA) metrics of every encounter of a waypoints .dat
+    file. The encounters are resampled every RESAMPLE_TIME_STEP seconds (see
+    resample_helpers) and each pair of aircraft is compared at the times both of them
+    are flying. The CPA of a pair is its time of smallest horizontal separation, an
+    encounter reports the pair with the smallest horizontal miss distance (hmd, NM),
+    their vertical separation at that time (vmd, ft) and whether any pair was within
+    NMAC_HORIZONTAL_DISTANCE and NMAC_VERTICAL_DISTANCE of each other at the same time.
+    Encounters whose aircraft never fly at the same time have no CPA (ac ids 0 and
+    NaN distances).
+'''
+CPA_METRICS_DTYPE = np.dtype([('encounter_id', '<i8'), ('ac_1', '<i8'), ('ac_2', '<i8'), ('cpa_time', '<f8'),
+                              ('hmd', '<f8'), ('vmd', '<f8'), ('nmac', '<i1')])
+
+cpa_metrics_cache = LRUByteCache(CPA_METRICS_CACHE_BYTE_SIZE)
+
+
+'''
+    CPA metrics (CPA_METRICS_DTYPE, ac_1 and ac_2 as aircraft positions or -1) of the
+    encounters enc_ids (a range) from one of their resampled chunks.
+'''
+def chunk_cpa_metrics(chunk, enc_ids, num_ac, time_step=RESAMPLE_TIME_STEP):
+    metrics = np.zeros(len(enc_ids), dtype=CPA_METRICS_DTYPE)
+    metrics['encounter_id'] = enc_ids
+    metrics['ac_1'], metrics['ac_2'] = -1, -1
+    metrics['cpa_time'], metrics['hmd'], metrics['vmd'] = np.nan, np.nan, np.nan
+
+    # the resampled times are whole steps, one key per encounter and step
+    encounters = chunk['encounter_id'] - enc_ids.start
+    steps = np.rint(chunk['time'] / time_step).astype(np.int64)
+    steps -= steps.min(initial=0)
+    keys = encounters * (steps.max(initial=0) + 1) + steps
+
+    for ac_1, ac_2 in itertools.combinations(range(num_ac), 2):
+        rows_1, rows_2 = np.flatnonzero(chunk['ac'] == ac_1), np.flatnonzero(chunk['ac'] == ac_2)
+        _, common_1, common_2 = np.intersect1d(keys[rows_1], keys[rows_2], assume_unique=True, return_indices=True)
+        rows_1, rows_2 = rows_1[common_1], rows_2[common_2]
+
+        hor_sep = np.hypot(chunk['xEast'][rows_1] - chunk['xEast'][rows_2], chunk['yNorth'][rows_1] - chunk['yNorth'][rows_2])
+        ver_sep = np.abs(chunk['zUp'][rows_1] - chunk['zUp'][rows_2])
+        pair_encounters = encounters[rows_1]
+
+        metrics['nmac'][pair_encounters[(hor_sep < NMAC_HORIZONTAL_DISTANCE) & (ver_sep < NMAC_VERTICAL_DISTANCE)]] = 1
+
+        # the common steps are sorted by encounter and time, so the CPA of the pair in every
+        # encounter is the first step at the smallest horizontal separation of its run
+        firsts = np.flatnonzero(np.diff(pair_encounters, prepend=-1) != 0)
+        if len(firsts) == 0:
+            continue
+        min_hor_sep = np.fmin.reduceat(hor_sep, firsts)
+        candidates = np.flatnonzero(hor_sep == np.repeat(min_hor_sep, np.diff(np.append(firsts, len(hor_sep)))))
+        cpa = candidates[np.diff(pair_encounters[candidates], prepend=-1) != 0]
+        cpa_encounters = pair_encounters[cpa]
+
+        closer = ~(metrics['hmd'][cpa_encounters] <= hor_sep[cpa])
+        cpa, cpa_encounters = cpa[closer], cpa_encounters[closer]
+        metrics['ac_1'][cpa_encounters], metrics['ac_2'][cpa_encounters] = ac_1, ac_2
+        metrics['cpa_time'][cpa_encounters] = chunk['time'][rows_1[cpa]]
+        metrics['hmd'][cpa_encounters] = hor_sep[cpa]
+        metrics['vmd'][cpa_encounters] = ver_sep[cpa]
+
+    return metrics
+
+
+'''
+    Worker side of stream_cpa_metrics: the CPA metrics of the encounters of one shard,
+    whose byte indices (and the end of the last one) are shard_enc_indices and whose
+    first encounter id is first_enc_id. Stops after the current chunk once
+    should_stop() returns True.
+'''
+def cpa_metrics_shard(filename, shard_enc_indices, first_enc_id, num_ac, should_stop=None, time_step=RESAMPLE_TIME_STEP, chunk_size=RESAMPLE_CHUNK_SIZE):
+    shard_enc_ids = range(len(shard_enc_indices) - 1)
+    chunk_enc_ids = [range(start, min(start+chunk_size, shard_enc_ids.stop)) for start in range(0, shard_enc_ids.stop, chunk_size)]
+
+    chunk_metrics = [np.zeros(0, dtype=CPA_METRICS_DTYPE)]
+    chunks = iter_resampled_encounter_chunks(filename, shard_enc_indices, shard_enc_ids, num_ac, time_step, chunk_size)
+    for chunk, enc_ids in zip(chunks, chunk_enc_ids):
+        chunk_metrics.append(chunk_cpa_metrics(chunk, enc_ids, num_ac, time_step))
+        if should_stop is not None and should_stop():
+            raise JobCancelled()
+
+    metrics = np.concatenate(chunk_metrics)
+    metrics['encounter_id'] += first_enc_id
+    return metrics
+
+
+'''
+    CPA metrics of the encounters enc_ids (a range) of filename. The encounters are
+    split into shards of CPA_SHARD_SIZE that are resampled and compared in parallel on
+    the application executor. progress_callback(num_done, num_encounters) is called as
+    the shards complete. Once should_stop() returns True the shards that have not
+    started are cancelled, the running ones stop after their current chunk and
+    JobCancelled is raised once they have.
+'''
+def stream_cpa_metrics(filename, enc_indices, enc_ids, num_ac, progress_callback=None, should_stop=None):
+    executor = get_executor()
+    shard_futures = [executor.submit(cpa_metrics_shard, filename, np.asarray(enc_indices[start:min(start+CPA_SHARD_SIZE, enc_ids.stop)+1]), start, num_ac, should_stop)
+                        for start in range(enc_ids.start, enc_ids.stop, CPA_SHARD_SIZE)]
+
+    shard_metrics = [np.zeros(0, dtype=CPA_METRICS_DTYPE)]
+    try:
+        for shard_future in shard_futures:
+            while True:
+                try:
+                    shard_metrics.append(shard_future.result(timeout=JOB_PROGRESS_INTERVAL))
+                    break
+                except concurrent.futures.TimeoutError:
+                    if should_stop is not None and should_stop():
+                        raise JobCancelled()
+
+            if progress_callback is not None:
+                progress_callback(sum(len(metrics) for metrics in shard_metrics), len(enc_ids))
+    finally:
+        # the running shards stop after their current chunk once the job is cancelled
+        for shard_future in shard_futures:
+            shard_future.cancel()
+        concurrent.futures.wait(shard_futures)
+
+    return np.concatenate(shard_metrics)
+
+
+'''
+    Background job behind the compute metrics button: computes the CPA metrics of the
+    encounters enc_ids of filename (relative to file_path, with aircraft ac_ids) and
+    saves them to the workspace file metrics_filename, read back by query_cpa_metrics.
+'''
+def run_cpa_metrics_job(job, file_path, filename, enc_indices, enc_ids, ac_ids, metrics_filename):
+    start = time.time()
+
+    metrics = stream_cpa_metrics(file_path + filename, enc_indices, enc_ids, len(ac_ids),
+                                 progress_callback=lambda num_done, num_encounters: job.report_progress(100 * num_done / num_encounters, 'Computing CPA metrics'),
+                                 should_stop=job.should_stop)
+
+    # aircraft positions to the ids of the set, no CPA (-1) to 0
+    ac_id_lookup = np.append(np.asarray(ac_ids, dtype=np.int64), 0)
+    metrics['ac_1'], metrics['ac_2'] = ac_id_lookup[metrics['ac_1']], ac_id_lookup[metrics['ac_2']]
+
+    metrics_filepath = file_path + metrics_filename
+    with open(partial_filepath(metrics_filepath), 'wb') as file:
+        np.save(file, metrics)
+    commit_workspace_file(metrics_filepath)
+    print(f'finished computing CPA metrics in {(time.time()-start)/60:.6f} mins.\n')
+
+    return {'filename': metrics_filename,
+            'source_filename': filename,
+            'num_encounters': len(metrics),
+            'num_nmacs': int(np.count_nonzero(metrics['nmac']))}
+
+
+'''
+    Reads the CPA metrics saved by run_cpa_metrics_job as a DataFrame, kept in
+    cpa_metrics_cache so that paging through them does not read the file again.
+'''
+def load_cpa_metrics(filepath):
+    metrics = cpa_metrics_cache.get(filepath)
+    if metrics is None:
+        metrics = pd.DataFrame(np.load(filepath))
+        cpa_metrics_cache.put(filepath, metrics, nbytes=int(metrics.memory_usage(index=True).sum()))
+
+    touch_workspace_file(filepath)
+    return metrics
+
+
+'''
+    Splits one condition of a DataTable filter_query ('{hmd} < 0.1', '{nmac} = 1', ...)
+    into its column, operator and value.
+'''
+FILTER_PART_PATTERN = re.compile(r'^\s*\{(?P<column>[^}]+)\}\s*s?(?P<operator>>=|<=|!=|<|>|=|ge|le|ne|lt|gt|eq|contains)\s*(?P<value>.*?)\s*$')
+FILTER_OPERATORS = {'>=': 'ge', '<=': 'le', '!=': 'ne', '<': 'lt', '>': 'gt', '=': 'eq', 'contains': 'eq'}
+
+
+def split_filter_part(filter_part):
+    match = FILTER_PART_PATTERN.match(filter_part)
+    if match is None:
+        return None, None, None
+
+    value = match.group('value').strip('"\'`')
+    try:
+        value = float(value)
+    except ValueError:
+        return None, None, None
+    return match.group('column'), FILTER_OPERATORS.get(match.group('operator'), match.group('operator')), value
+
+
+'''
+    The CPA metrics in filepath matching the DataTable filter_query, sorted by the
+    columns of sort_by. The result of the last queries is cached, paging through it
+    only slices the DataFrame.
+'''
+def query_cpa_metrics(filepath, filter_query, sort_by):
+    query_key = (filepath, filter_query or '', tuple((column['column_id'], column['direction']) for column in sort_by or []))
+    metrics = cpa_metrics_cache.get(query_key)
+    if metrics is not None:
+        return metrics
+
+    metrics = load_cpa_metrics(filepath)
+    if filter_query:
+        mask = np.ones(len(metrics), dtype=bool)
+        for filter_part in filter_query.split(' && '):
+            column, operator, value = split_filter_part(filter_part)
+            if column in metrics:
+                mask &= getattr(metrics[column], operator)(value).to_numpy()
+        metrics = metrics[mask]
+
+    if sort_by:
+        metrics = metrics.sort_values([column['column_id'] for column in sort_by], ascending=[column['direction'] == 'asc' for column in sort_by],
+                                      kind='mergesort', na_position='last')
+
+    cpa_metrics_cache.put(query_key, metrics, nbytes=int(metrics.memory_usage(index=True).sum()))
+    return metrics
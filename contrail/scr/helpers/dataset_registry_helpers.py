@@ -0,0 +1,92 @@
+import os
+import uuid
+import base64
+import numpy as np
+
+from helpers.constants import *
+from helpers.cache_helpers import *
+from helpers.encounter_index_helpers import *
+from helpers.workspace_helpers import *
+
+'''
+    Server side registry of the datasets the app is working with. The encounter
+    byte indices (and, for created or json data, the encoded encounters) live here
+    and the memory-data/generated-data stores only carry the dataset handle plus a
+    few small fields, so they are not shipped to the browser and back on every
+    callback. Generated datasets also keep the histograms counted while they were
+    generated. Entries are evicted least recently used first once the registry grows
+    past DATASET_REGISTRY_BYTE_SIZE. Created and json datasets are a single small
+    encounter, their store also keeps the encoded encounter (created_dataset_store)
+    so that any server process can register them again.
+'''
+dataset_registry = LRUByteCache(DATASET_REGISTRY_BYTE_SIZE)
+
+
+def register_dataset(encounter_indices, encounters_data=None, histograms=None, handle=None):
+    handle = handle if handle is not None else uuid.uuid4().hex
+    dataset_registry.put(handle, {'encounter_indices': encounter_indices,
+                                  'encounters_data': encounters_data,
+                                  'histograms': histograms})
+    return handle
+
+
+'''
+    Registers a created or json dataset and returns the fields of its memory-data
+    store: the handle plus the encoded encounters, base64 encoded, and their indices.
+'''
+def created_dataset_store(encounter_indices, encounters_data):
+    return {'handle': register_dataset(encounter_indices, encounters_data),
+            'encounters_data': base64.b64encode(encounters_data).decode('ascii'),
+            'encounter_indices': [int(index) for index in encounter_indices]}
+
+
+'''
+    Byte indices of a file-backed dataset, indexable by encounter id and ending with
+    the end of the last encounter. Encounter ids of a loaded file start at 1, so
+    index 0 only pads the array.
+'''
+def encounter_indices_from_offsets(offsets, data_type):
+    if data_type == 'loaded':
+        return np.concatenate((np.zeros(1, dtype=np.uint64), np.asarray(offsets, dtype=np.uint64)))
+    return np.asarray(offsets)
+
+
+'''
+    Returns the registered dataset behind memory_data (the contents of the memory-data
+    or generated-data store). A file-backed dataset that has been evicted, or was
+    registered by another server process, is re-registered from the file's sidecar
+    index, and one whose file has been evicted from the workspace is dropped. Created
+    and json datasets are registered again from the encoded encounter in their store,
+    None is returned if there is nothing to register them from.
+'''
+def get_dataset(memory_data, file_path):
+    dataset = dataset_registry.get(memory_data['handle'])
+
+    if memory_data['type'] == 'loaded' or memory_data['type'] == 'generated':
+        filepath = file_path + memory_data['filename']
+        if not os.path.exists(filepath):
+            print('Dataset file', filepath, 'no longer exists.')
+            dataset_registry.pop(memory_data['handle'])
+            return None
+
+        if is_workspace_file(filepath):
+            touch_workspace_file(filepath)
+
+        if dataset is None:
+            offsets, _, _ = load_or_build_encounter_index(filepath)
+            dataset = {'encounter_indices': encounter_indices_from_offsets(offsets, memory_data['type']),
+                       'encounters_data': None,
+                       'histograms': None}
+            dataset_registry.put(memory_data['handle'], dataset)
+        return dataset
+
+    if dataset is None and memory_data.get('encounters_data') is not None:
+        # evicted, or registered by another server process
+        dataset = {'encounter_indices': memory_data['encounter_indices'],
+                   'encounters_data': base64.b64decode(memory_data['encounters_data']),
+                   'histograms': None}
+        dataset_registry.put(memory_data['handle'], dataset)
+
+    if dataset is None:
+        print('Dataset is no longer available, load or create it again.')
+    return dataset
@@ -0,0 +1,119 @@
+import os
+import mmap
+import threading
+import numpy as np
+
+from helpers.constants import *
+
+HEADER_DTYPE = np.dtype([('num_enc', '<u4'), ('num_ac', '<u4')])
+
+'''
+    Packed structured dtype of one encounter block whose aircraft have the given
+    numbers of update waypoints: the initial waypoints of all aircraft, then per
+    aircraft its num_updates field followed by its updates. Every encounter of a
+    generated file has the same layout, so a run of encounters is an array of it.
+'''
+def encounter_dtype(num_updates):
+    fields = [('initial', INITIAL_DTYPE, (len(num_updates),))]
+    for ac, ac_num_updates in enumerate(num_updates):
+        fields.append((f'num_updates_{ac}', NUM_UPDATE_DTYPE))
+        fields.append((f'updates_{ac}', UPDATE_DTYPE, (ac_num_updates,)))
+    return np.dtype(fields)
+
+
+'''
+    Returns the num_updates field of every aircraft of the encounter block enc_data.
+'''
+def encounter_num_updates(enc_data, num_ac):
+    num_updates = []
+    cursor = num_ac * INITIAL_DTYPE.itemsize
+    for _ in range(num_ac):
+        num_updates.append(int(np.frombuffer(enc_data, dtype=NUM_UPDATE_DTYPE, count=1, offset=cursor)[0]))
+        cursor += NUM_UPDATE_BYTE_SIZE + num_updates[-1] * UPDATE_DTYPE.itemsize
+    return num_updates
+
+
+_open_encounter_files = {}
+_open_encounter_files_lock = threading.Lock()
+
+class EncounterFile:
+    '''
+        Read-only, memory-mapped view of a waypoints .dat file. The file is mapped
+        once and every encounter is handed out as a zero-copy memoryview (or NumPy
+        view) into the mapping, so the OS page cache decides what is resident
+        instead of the python process. Use get_encounter_file() rather than the
+        constructor so that each file is only mapped once per process.
+        The mapping is never released explicitly: other threads may still be reading
+        views of it, it is unmapped once the last reference to it is gone.
+    '''
+    def __init__(self, filepath):
+        self.filepath = filepath
+
+        stat = os.stat(filepath)
+        self.size, self.mtime = stat.st_size, stat.st_mtime_ns
+
+        # the mapping keeps its own handle on the file
+        with open(filepath, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if self.size > 0 else None
+        self.buffer = memoryview(self._mmap) if self._mmap is not None else memoryview(b'')
+
+        if self.size >= HEADER_DTYPE.itemsize:
+            header = np.frombuffer(self.buffer, dtype=HEADER_DTYPE, count=1)[0]
+            self.num_enc, self.num_ac = int(header['num_enc']), int(header['num_ac'])
+        else:
+            self.num_enc, self.num_ac = 0, 0
+
+    def is_stale(self):
+        try:
+            stat = os.stat(self.filepath)
+        except FileNotFoundError:
+            return True
+        return stat.st_size != self.size or stat.st_mtime_ns != self.mtime
+
+    def byte_range(self, start, end=None):
+        return self.buffer[start:end if end is not None else self.size]
+
+    '''
+        Returns the bytes of encounter enc_id as a memoryview into the mapping.
+        enc_indices holds the start byte of every encounter (indexed by enc_id),
+        an encounter ends where the next one starts or at the end of the file.
+    '''
+    def encounter(self, enc_id, enc_indices):
+        enc_start_ind = int(enc_indices[enc_id])
+        if enc_id+1 >= len(enc_indices):
+            return self.byte_range(enc_start_ind)
+        return self.byte_range(enc_start_ind, int(enc_indices[enc_id+1]))
+
+
+'''
+    Returns the process wide EncounterFile for filepath, mapping the file on first
+    use. A cached mapping is replaced when the file on disk has changed size or
+    modification time since it was mapped.
+'''
+def get_encounter_file(filepath):
+    key = os.path.abspath(filepath)
+
+    with _open_encounter_files_lock:
+        enc_file = _open_encounter_files.get(key)
+        if enc_file is not None and enc_file.is_stale():
+            enc_file = None
+
+        if enc_file is None:
+            enc_file = EncounterFile(filepath)
+            _open_encounter_files[key] = enc_file
+
+    return enc_file
+
+
+'''
+    Forgets the process wide mapping of filepath, called when the file is removed.
+    Readers that still hold it keep reading the removed file, which is unmapped (and
+    its space freed) once they are done. Files are always replaced by renaming a new
+    file over them, never rewritten in place, so a mapping never sees its file
+    truncated.
+'''
+def close_encounter_file(filepath):
+    key = os.path.abspath(filepath)
+
+    with _open_encounter_files_lock:
+        _open_encounter_files.pop(key, None)
@@ -0,0 +1,219 @@
+import os
+import zlib
+import numpy as np
+
+from helpers.constants import *
+
+INDEX_FILE_EXTENSION = '.idx'
+INDEX_MAGIC = b'CTRLIDX1'
+INDEX_CHECKSUM_BYTE_SIZE = 4096
+
+# <file>.idx layout: this header followed by num_enc+1 little endian uint64 offsets,
+# the byte index of every encounter plus the end of the last encounter
+INDEX_HEADER_DTYPE = np.dtype([('magic', 'S8'),
+                               ('file_size', '<u8'),
+                               ('file_mtime', '<i8'),
+                               ('header_checksum', '<u4'),
+                               ('num_enc', '<u4'),
+                               ('num_ac', '<u4'),
+                               ('reserved', '<u4')])
+
+def index_filepath(filepath):
+    return filepath + INDEX_FILE_EXTENSION
+
+
+'''
+    Checksum of the leading bytes of a .dat file (its num_enc/num_ac header and
+    the start of the first encounter). Stored in the sidecar index so that an index
+    is not reused for a different file that happens to have the same size and mtime.
+'''
+def dat_header_checksum(filepath):
+    with open(filepath, 'rb') as file:
+        return zlib.crc32(file.read(INDEX_CHECKSUM_BYTE_SIZE))
+
+
+class EncounterIndexer:
+    '''
+        Incremental encounter offset builder. Bytes of a .dat file are fed in order,
+        in chunks of any size, and the indexer hops from encounter to encounter using
+        only the num_updates fields. Waypoint bytes are never inspected, so a reader
+        may skip them entirely: resume_position is the next file position the
+        indexer needs bytes from.
+    '''
+    def __init__(self):
+        self.num_enc, self.num_ac = None, None
+        self.offsets = None
+        self.enc_count = 0
+        self.received = 0
+        self.cursor = 0
+        self._ac_count = 0
+        self._in_encounter = False
+        self._carry = b''
+
+    @property
+    def done(self):
+        return self.num_enc is not None and self.enc_count == self.num_enc
+
+    @property
+    def resume_position(self):
+        return self.received if self._carry else max(self.cursor, self.received)
+
+    def feed(self, data, position=None):
+        position = self.received if position is None else position
+        if self._carry:
+            data = self._carry + bytes(data)
+            position -= len(self._carry)
+            self._carry = b''
+        end = position + len(data)
+        self.received = max(self.received, end)
+
+        if self.num_enc is None:
+            if end < 2 * INFO_BYTE_SIZE:
+                self._carry = bytes(data)
+                return
+            self.num_enc = int.from_bytes(data[0:INFO_BYTE_SIZE], byteorder='little')
+            self.num_ac = int.from_bytes(data[INFO_BYTE_SIZE:2*INFO_BYTE_SIZE], byteorder='little')
+            self.offsets = np.empty(self.num_enc+1, dtype=np.uint64)
+            self.cursor = 2 * INFO_BYTE_SIZE
+
+        initial_bytes = self.num_ac * INITIAL_DIM * WAYPOINT_BYTE_SIZE
+        while not self.done:
+            if not self._in_encounter:
+                self.offsets[self.enc_count] = self.cursor
+                self.cursor += initial_bytes
+                self._in_encounter = True
+
+            if self._ac_count < self.num_ac:
+                if self.cursor + NUM_UPDATE_BYTE_SIZE > end:
+                    if self.cursor < end:
+                        # num_updates field is split across two chunks
+                        self._carry = bytes(data[self.cursor-position:])
+                    break
+
+                num_updates = int.from_bytes(data[self.cursor-position:self.cursor-position+NUM_UPDATE_BYTE_SIZE], byteorder='little')
+                self.cursor += NUM_UPDATE_BYTE_SIZE + num_updates * UPDATE_DIM * WAYPOINT_BYTE_SIZE
+                self._ac_count += 1
+
+            if self._ac_count == self.num_ac:
+                self._ac_count = 0
+                self._in_encounter = False
+                self.enc_count += 1
+
+        if self.done:
+            self.offsets[self.num_enc] = self.cursor
+
+
+'''
+    Walks every encounter of a .dat file and returns the offsets array (start of
+    every encounter followed by the end of the last one), num_ac and num_enc.
+    The file is read in bounded chunks of chunk_size bytes and the update waypoints
+    between two num_updates fields are seeked over, so peak memory does not depend
+    on the file size. progress_callback(bytes_indexed, file_size) is called after
+    every chunk; if should_stop() returns True indexing stops and None is returned.
+'''
+def build_encounter_index(filepath, chunk_size=INDEX_CHUNK_BYTE_SIZE, progress_callback=None, should_stop=None):
+    file_size = os.path.getsize(filepath)
+
+    indexer = EncounterIndexer()
+    chunk = bytearray(chunk_size)
+    with open(filepath, 'rb') as file:
+        while not indexer.done:
+            position = indexer.resume_position
+            file.seek(position)
+            num_bytes = file.readinto(chunk)
+            if num_bytes == 0:
+                raise ValueError(f'{filepath} is truncated, expected encounter data at byte {position}')
+
+            indexer.feed(memoryview(chunk)[:num_bytes], position)
+
+            if progress_callback is not None:
+                progress_callback(min(indexer.cursor, file_size), file_size)
+            if should_stop is not None and should_stop():
+                return None
+
+    if indexer.cursor > file_size:
+        raise ValueError(f'{filepath} is truncated, last encounter ends at byte {indexer.cursor}')
+
+    return indexer.offsets, indexer.num_ac, indexer.num_enc
+
+
+'''
+    Writes the sidecar <file>.idx for filepath. The index is written to a temporary
+    file and renamed into place so a concurrent reader never sees a partial index.
+    Failing to write (e.g. read only data directory) only costs a rebuild next time.
+'''
+def write_encounter_index(filepath, offsets, num_ac, num_enc):
+    stat = os.stat(filepath)
+
+    header = np.zeros(1, dtype=INDEX_HEADER_DTYPE)
+    header['magic'] = INDEX_MAGIC
+    header['file_size'] = stat.st_size
+    header['file_mtime'] = stat.st_mtime_ns
+    header['header_checksum'] = dat_header_checksum(filepath)
+    header['num_enc'] = num_enc
+    header['num_ac'] = num_ac
+
+    idx_filepath = index_filepath(filepath)
+    tmp_filepath = idx_filepath + '.tmp.' + str(os.getpid())
+    try:
+        with open(tmp_filepath, 'wb') as file:
+            file.write(header.tobytes())
+            file.write(np.ascontiguousarray(offsets, dtype='<u8').tobytes())
+        os.replace(tmp_filepath, idx_filepath)
+    except OSError as e:
+        print('Could not write encounter index', idx_filepath, e)
+        if os.path.exists(tmp_filepath):
+            os.remove(tmp_filepath)
+
+
+'''
+    Memory-maps the sidecar index of filepath. Returns (offsets, num_ac, num_enc), or
+    None when there is no index or it was written for a different version of the file.
+'''
+def load_encounter_index(filepath):
+    idx_filepath = index_filepath(filepath)
+    if not os.path.exists(idx_filepath):
+        return None
+
+    try:
+        header = np.fromfile(idx_filepath, dtype=INDEX_HEADER_DTYPE, count=1)
+        if len(header) == 0 or header['magic'][0] != INDEX_MAGIC:
+            return None
+        header = header[0]
+
+        stat = os.stat(filepath)
+        if header['file_size'] != stat.st_size or header['file_mtime'] != stat.st_mtime_ns:
+            return None
+        if header['header_checksum'] != dat_header_checksum(filepath):
+            return None
+
+        num_enc, num_ac = int(header['num_enc']), int(header['num_ac'])
+        if os.path.getsize(idx_filepath) != INDEX_HEADER_DTYPE.itemsize + (num_enc+1) * np.dtype('<u8').itemsize:
+            return None
+
+        offsets = np.memmap(idx_filepath, dtype='<u8', mode='r', offset=INDEX_HEADER_DTYPE.itemsize, shape=(num_enc+1,))
+    except (OSError, ValueError) as e:
+        print('Could not read encounter index', idx_filepath, e)
+        return None
+
+    return offsets, num_ac, num_enc
+
+
+'''
+    Returns the offsets of filepath from its sidecar index, building and writing the
+    index first if the file has not been indexed yet (or has changed since). Returns
+    None if should_stop() cut the build short.
+'''
+def load_or_build_encounter_index(filepath, progress_callback=None, should_stop=None):
+    index = load_encounter_index(filepath)
+    if index is not None:
+        return index
+
+    index = build_encounter_index(filepath, progress_callback=progress_callback, should_stop=should_stop)
+    if index is None:
+        return None
+
+    offsets, num_ac, num_enc = index
+    write_encounter_index(filepath, offsets, num_ac, num_enc)
+
+    return offsets, num_ac, num_enc
@@ -0,0 +1,65 @@
+import atexit
+import threading
+import multiprocessing as mp
+import concurrent.futures
+
+from helpers.constants import *
+
+'''
+    Application wide executor that callbacks submit their heavy work to, so that no
+    callback has to spin up (and tear down) a pool of its own. The executor is
+    configured once at startup with init_executor and only created the first time
+    get_executor is called, which keeps the reloader process of the debug server
+    from starting workers it never uses.
+'''
+_executor = None
+_executor_config = {'kind': EXECUTOR_KIND, 'max_workers': EXECUTOR_MAX_WORKERS}
+_executor_lock = threading.Lock()
+
+
+'''
+    Sets the kind ('process' or 'thread') and size of the application executor.
+    Has no effect on an executor that is already running.
+'''
+def init_executor(kind=EXECUTOR_KIND, max_workers=EXECUTOR_MAX_WORKERS):
+    if kind not in ('process', 'thread'):
+        raise ValueError(f"executor kind must be 'process' or 'thread', not {kind!r}")
+
+    with _executor_lock:
+        if _executor is not None:
+            print('Executor is already running, keeping its configuration.')
+            return
+        _executor_config['kind'] = kind
+        _executor_config['max_workers'] = max_workers
+
+
+def get_executor():
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            if _executor_config['kind'] == 'process':
+                # workers are spawned rather than forked from the multithreaded server
+                _executor = concurrent.futures.ProcessPoolExecutor(max_workers=_executor_config['max_workers'],
+                                                                   mp_context=mp.get_context('spawn'))
+            else:
+                _executor = concurrent.futures.ThreadPoolExecutor(max_workers=_executor_config['max_workers'],
+                                                                  thread_name_prefix='contrail-worker')
+        return _executor
+
+
+'''
+    Stops the application executor, cancelling work that has not started yet.
+    A later get_executor starts a fresh one.
+'''
+def shutdown_executor(wait=True):
+    global _executor
+
+    with _executor_lock:
+        executor, _executor = _executor, None
+
+    if executor is not None:
+        executor.shutdown(wait=wait, cancel_futures=True)
+
+
+atexit.register(shutdown_executor)
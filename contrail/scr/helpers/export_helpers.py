@@ -0,0 +1,101 @@
+import os
+import json
+import time
+import uuid
+import struct
+
+from flask import Response
+from werkzeug.utils import secure_filename
+
+from helpers.constants import *
+
+'''
+    Streamed download of a generated set as a .dat file, served by the Flask server
+    behind the app. Saving writes nothing to disk but a small export spec, the
+    download is a virtual concatenation of a new num_enc/num_ac header and the byte
+    range of the generated file from start_byte on (the encounters after the nominal
+    one), read and sent EXPORT_CHUNK_BYTE_SIZE bytes at a time:
+
+        GET /export/<export_id>
+'''
+EXPORT_SPEC_EXTENSION = '.json'
+
+
+def export_spec_filepath(export_id):
+    return os.path.join(EXPORT_DIRECTORY, export_id + EXPORT_SPEC_EXTENSION)
+
+
+'''
+    Drops the export specs older than EXPORT_MAX_AGE seconds.
+'''
+def remove_old_exports():
+    now = time.time()
+    for filename in os.listdir(EXPORT_DIRECTORY):
+        filepath = os.path.join(EXPORT_DIRECTORY, filename)
+        if now - os.path.getmtime(filepath) > EXPORT_MAX_AGE:
+            os.remove(filepath)
+
+
+'''
+    Registers the download of src_filepath from start_byte on, preceded by a
+    num_enc/num_ac header, and returns the url it is served from.
+'''
+def create_export(src_filepath, start_byte, num_enc, num_ac, download_filename):
+    os.makedirs(EXPORT_DIRECTORY, exist_ok=True)
+    remove_old_exports()
+
+    export_id = uuid.uuid4().hex
+    with open(export_spec_filepath(export_id), 'w') as file:
+        json.dump({'filepath': os.path.abspath(src_filepath),
+                   'start_byte': int(start_byte),
+                   'num_enc': int(num_enc),
+                   'num_ac': int(num_ac),
+                   'filename': secure_filename(download_filename) or 'generated_waypoints.dat'}, file)
+
+    return f'/export/{export_id}'
+
+
+'''
+    Registers the download of a generated set (the contents of the generated-data
+    store, with byte indices enc_indices) without its nominal encounter. The header
+    counts the aircraft the set was generated for, which may be fewer than those of
+    the set it was generated from.
+'''
+def create_generated_export(generated_data, enc_indices, file_path, download_filename):
+    return create_export(file_path + generated_data['filename'], enc_indices[1], generated_data['num_encounters']-1,
+                         len(generated_data['ac_ids']), download_filename)
+
+
+def iter_export_bytes(spec):
+    yield struct.pack('<II', spec['num_enc'], spec['num_ac'])
+
+    # the open file stays readable even if the workspace evicts it meanwhile
+    with open(spec['filepath'], 'rb') as file:
+        file.seek(spec['start_byte'])
+        while True:
+            data = file.read(EXPORT_CHUNK_BYTE_SIZE)
+            if not data:
+                break
+            yield data
+
+
+def export_response(export_id):
+    spec = None
+    if export_id.isalnum():
+        try:
+            with open(export_spec_filepath(export_id)) as file:
+                spec = json.load(file)
+        except (OSError, ValueError):
+            pass
+
+    if spec is None or not os.path.exists(spec['filepath']):
+        return 'This export is no longer available, save the encounter set again.', 404
+
+    content_length = 2 * INFO_BYTE_SIZE + os.path.getsize(spec['filepath']) - spec['start_byte']
+    return Response(iter_export_bytes(spec), mimetype='application/octet-stream', direct_passthrough=True,
+                    headers={'Content-Length': str(content_length),
+                             'Content-Disposition': f'attachment; filename="{spec["filename"]}"'})
+
+
+def register_export_routes(server):
+    server.add_url_rule('/export/<export_id>', 'export_response', export_response, methods=['GET'])
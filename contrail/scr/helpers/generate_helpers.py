@@ -1,13 +1,29 @@
+import os
 import struct
 import time
+import shutil
+import hashlib
+import secrets
+import concurrent.futures
 import numpy as np
 import multiprocessing as mp
 from itertools import repeat
 
 
 from helpers.parse_encounter_helpers import *
+from helpers.encounter_file_helpers import *
+from helpers.encounter_index_helpers import *
+from helpers.cache_helpers import *
+from helpers.sampling_helpers import *
+from helpers.histogram_helpers import *
+from helpers.executor_helpers import *
+from helpers.job_helpers import *
+from helpers.dataset_registry_helpers import *
+from helpers.workspace_helpers import *
 from helpers.constants import *
 
+exp_kernel_cache = LRUByteCache(KERNEL_CACHE_BYTE_SIZE)
+
 def generation_error_found(memory_data_type, nom_ac_ids, num_encounters, cov_radio_value, 
                  sigma_hor, sigma_ver, exp_kernel_a, exp_kernel_b, exp_kernel_c) -> bool:
     error = False
@@ -31,203 +47,297 @@ def generation_error_found(memory_data_type, nom_ac_ids, num_encounters, cov_rad
     
     return error
 
+'''
+    Builds the mean and the (3N x 3N) exponential kernel covariance of a nominal path
+    of N [x, y, z] waypoints. Horizontal elements (x's and y's are interchangeable)
+    are exp(-b (u_i - u_j)^2 / (2 a^2)), vertical elements exp(-c (z_i - z_j)^2 / (2 a^2))
+    and horizontal/vertical cross elements are 0. The kernel is built from pairwise
+    difference arrays and cached on (nominal path, a, b, c), the returned arrays are
+    read only since they are shared between calls.
+'''
 def exp_kernel_func(inputs, param_a, param_b, param_c): 
-    inputs = np.array(inputs)
+    inputs = np.asarray(inputs, dtype=float)
     N = inputs.shape[0]*inputs.shape[1]
 
+    cache_key = (hashlib.sha1(inputs.tobytes()).hexdigest(), inputs.shape, param_a, param_b, param_c)
+    cached = exp_kernel_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
     K_mean = inputs.reshape((N,))
     K_cov = np.zeros((N, N)) 
-    
-    for i, inputs_i in enumerate(inputs):
-        for j, inputs_j in enumerate(inputs):
 
-            if i <= j:        
-                [x_i,y_i,z_i] = inputs_i
-                [x_j,y_j,z_j] = inputs_j
-                
-                dist_xy = [ [(x_i-x_j), (x_i-y_j)], 
-                            [(y_i-x_j), (y_i-y_j)] ]
+    waypoint_ids = np.arange(inputs.shape[0])
+    xy_ids = (3*waypoint_ids[:, None] + np.array([0, 1])).ravel()
+    z_ids = 3*waypoint_ids + 2
 
-                K_cov[3*i:3*i+2, 3*j:3*j+2] = np.exp(-(param_b * np.power(dist_xy, 2)) / (2 * param_a**2))
-                
-                dist_z = [(z_i-z_j)]
-                K_cov[3*i+2, 3*j+2] = np.exp(-(param_c * np.power(dist_z, 2)) / (2 * param_a**2))
+    xy = inputs[:, :2].ravel()
+    z = inputs[:, 2]
+    K_cov[np.ix_(xy_ids, xy_ids)] = np.exp(-(param_b * np.square(xy[:, None] - xy[None, :])) / (2 * param_a**2))
+    K_cov[np.ix_(z_ids, z_ids)] = np.exp(-(param_c * np.square(z[:, None] - z[None, :])) / (2 * param_a**2))
 
-                if i != j:
-                    K_cov[3*j:3*j+3, 3*i:3*i+3] = np.transpose(K_cov[3*i:3*i+3, 3*j:3*j+3])
+    K_mean.setflags(write=False)
+    K_cov.setflags(write=False)
+    exp_kernel_cache.put(cache_key, (K_mean, K_cov))
 
     return K_mean, K_cov
     
 
-def stream_generated_data(generated_data, ac_times, filename, num_encounters):
-    enc_data_indices = [None] * (num_encounters+1)
-    ac_ids = len(ac_times)
-
-    ac1_minmax_hist = []
-    ac2_minmax_hist = []
-
-    with open(filename, mode='wb') as file:
-        file.write(struct.pack('<II', num_encounters+1, ac_ids))
-
-        cursor = 2 * INFO_BYTE_SIZE
-        
-        for enc_id in range(num_encounters+1):
-            enc_data_indices[enc_id] = cursor
-            
-            # stream initial waypoints
-            for ac in range(ac_ids):
-                waypoint = generated_data[ac][enc_id][0] 
-                waypoint_data = struct.pack('ddd', waypoint[0]*NM_TO_FT, waypoint[1]*NM_TO_FT, waypoint[2])
-                file.write(waypoint_data)
-
-                time_waypoint = [*[0], *waypoint]
-                if ac == 0:
-                    ac1_minmax_hist.append(time_waypoint)
-                elif ac == 1:
-                    ac2_minmax_hist.append(time_waypoint)
-                    
-            cursor += ac_ids * INITIAL_DIM * WAYPOINT_BYTE_SIZE
-
-            # stream update waypoints
-            for ac in range(ac_ids):
-                updates = generated_data[ac][enc_id][1:] 
-                num_updates = struct.pack('<H', len(updates)) 
-                file.write(num_updates)
-
-                cursor += NUM_UPDATE_BYTE_SIZE
-
-                ac_time = ac_times[ac][1:]
-                for i, waypoint in enumerate(updates):
-                    waypoint_data = struct.pack('dddd', ac_time[i], waypoint[0]*NM_TO_FT, waypoint[1]*NM_TO_FT, waypoint[2])
-                    file.write(waypoint_data)
-
-                    time_waypoint = [*[ac_time[i]], *waypoint]
-                    if ac == 0:
-                        ac1_minmax_hist.append(time_waypoint)
-                    elif ac == 1:
-                        ac2_minmax_hist.append(time_waypoint)
-
-                cursor += len(updates) * UPDATE_DIM * WAYPOINT_BYTE_SIZE
-
-    ac1_minmax_hist = np.array(ac1_minmax_hist)
-    ac2_minmax_hist = np.array(ac2_minmax_hist)
-    if ac1_minmax_hist.shape[0] == 0:
-        ac1_minmax_hist = np.array([], dtype=np.int64).reshape(0,4)
-    if ac2_minmax_hist.shape[0] == 0:
-        ac2_minmax_hist = np.array([], dtype=np.int64).reshape(0,4)
-
-    ac_minmax_hist = np.vstack((ac1_minmax_hist, ac2_minmax_hist))
-    minmax_hist = [[ac_minmax_hist.min(axis=0), ac_minmax_hist.max(axis=0)],
-                    [ac_minmax_hist.min(axis=0), ac_minmax_hist.max(axis=0)]]
-
-    return enc_data_indices, minmax_hist
-
-
-def stream_count_histograms(filename, enc_indices, minmax_hist, num_encounters, ac_ids):    
-
-    ac_1_xy_bin_counts = np.zeros((NUM_BINS_HISTOGRAM+1, NUM_BINS_HISTOGRAM+1))
-    ac_1_tz_bin_counts = np.zeros((NUM_BINS_HISTOGRAM+1, NUM_BINS_HISTOGRAM+1))
-    ac_2_xy_bin_counts = np.zeros((NUM_BINS_HISTOGRAM+1, NUM_BINS_HISTOGRAM+1))
-    ac_2_tz_bin_counts = np.zeros((NUM_BINS_HISTOGRAM+1, NUM_BINS_HISTOGRAM+1))
-
-    [ac1_minmax_hist, ac2_minmax_hist] = minmax_hist
-    ac1_minmax_hist = np.array(ac1_minmax_hist)
-    ac2_minmax_hist = np.array(ac2_minmax_hist)
-    
-    ac1_t_minmax, ac1_x_minmax, ac1_y_minmax, ac1_z_minmax = ac1_minmax_hist.T[0], ac1_minmax_hist.T[1], ac1_minmax_hist.T[2], ac1_minmax_hist.T[3]
-    ac1_t_bin_width = (ac1_t_minmax[1]-ac1_t_minmax[0]) / NUM_BINS_HISTOGRAM
-    ac1_x_bin_width = (ac1_x_minmax[1]-ac1_x_minmax[0]) / NUM_BINS_HISTOGRAM
-    ac1_y_bin_width = (ac1_y_minmax[1]-ac1_y_minmax[0]) / NUM_BINS_HISTOGRAM
-    ac1_z_bin_width = (ac1_z_minmax[1]-ac1_z_minmax[0]) / NUM_BINS_HISTOGRAM
-
-    ac1_t_edges = np.linspace(ac1_t_minmax[0], ac1_t_minmax[1], num=NUM_BINS_HISTOGRAM+1, endpoint=True)    
-    ac1_x_edges = np.linspace(ac1_x_minmax[0], ac1_x_minmax[1], num=NUM_BINS_HISTOGRAM+1, endpoint=True)
-    ac1_y_edges = np.linspace(ac1_y_minmax[0], ac1_y_minmax[1], num=NUM_BINS_HISTOGRAM+1, endpoint=True)
-    ac1_z_edges = np.linspace(ac1_z_minmax[0], ac1_z_minmax[1], num=NUM_BINS_HISTOGRAM+1, endpoint=True)
-
-    ac2_t_minmax, ac2_x_minmax, ac2_y_minmax, ac2_z_minmax = ac2_minmax_hist.T[0], ac2_minmax_hist.T[1], ac2_minmax_hist.T[2], ac2_minmax_hist.T[3]
-    ac2_t_bin_width = (ac2_t_minmax[1]-ac2_t_minmax[0]) / NUM_BINS_HISTOGRAM
-    ac2_x_bin_width = (ac2_x_minmax[1]-ac2_x_minmax[0]) / NUM_BINS_HISTOGRAM
-    ac2_y_bin_width = (ac2_y_minmax[1]-ac2_y_minmax[0]) / NUM_BINS_HISTOGRAM
-    ac2_z_bin_width = (ac2_z_minmax[1]-ac2_z_minmax[0]) / NUM_BINS_HISTOGRAM
-
-    ac2_t_edges = np.linspace(ac2_t_minmax[0], ac2_t_minmax[1], num=NUM_BINS_HISTOGRAM+1, endpoint=True)    
-    ac2_x_edges = np.linspace(ac2_x_minmax[0], ac2_x_minmax[1], num=NUM_BINS_HISTOGRAM+1, endpoint=True)
-    ac2_y_edges = np.linspace(ac2_y_minmax[0], ac2_y_minmax[1], num=NUM_BINS_HISTOGRAM+1, endpoint=True)
-    ac2_z_edges = np.linspace(ac2_z_minmax[0], ac2_z_minmax[1], num=NUM_BINS_HISTOGRAM+1, endpoint=True)
-
-    with open(filename, 'rb') as file:
-        enc_data = file.read(2*INFO_BYTE_SIZE)
-        [num_enc_ids,num_ac_ids] = struct.unpack('<II', enc_data[0:2*INFO_BYTE_SIZE])
-
-    for enc_id in range(num_encounters):
-        enc_start_ind = enc_indices[enc_id]
-        cursor = 0
-
-        with open(filename, 'rb') as file:
-            file.seek(enc_start_ind)
-            if enc_id+1 >= len(enc_indices):
-                enc_data = file.read()
-
-            else:
-                enc_end_ind = enc_indices[enc_id+1]
-                num_bytes = enc_end_ind - enc_start_ind
-                enc_data = file.read(num_bytes)
-        
-        # count initial waypoints
-        for ac in ac_ids:
-            [x,y,z] = struct.unpack('ddd', enc_data[cursor:cursor+(WAYPOINT_BYTE_SIZE*INITIAL_DIM)])
-            x, y = x*FT_TO_NM, y*FT_TO_NM
-
-            if ac == 1 :
-                ac1_x_ind = (x - ac1_x_minmax[0]) // ac1_x_bin_width
-                ac1_y_ind = (y - ac1_y_minmax[0]) // ac1_y_bin_width
-                ac1_t_ind = (0 - ac1_t_minmax[0]) // ac1_t_bin_width
-                ac1_z_ind = (z - ac1_z_minmax[0]) // ac1_z_bin_width 
-
-                ac_1_xy_bin_counts[int(ac1_y_ind), int(ac1_x_ind)] += 1
-                ac_1_tz_bin_counts[int(ac1_z_ind), int(ac1_t_ind)] += 1
-
-            elif ac == 2:
-                ac2_x_ind = (x - ac2_x_minmax[0]) // ac2_x_bin_width
-                ac2_y_ind = (y - ac2_y_minmax[0]) // ac2_y_bin_width 
-                ac2_t_ind = (0 - ac2_t_minmax[0]) // ac2_t_bin_width
-                ac2_z_ind = (z - ac2_z_minmax[0]) // ac2_z_bin_width 
-
-                ac_2_xy_bin_counts[int(ac2_y_ind), int(ac2_x_ind)] += 1
-                ac_2_tz_bin_counts[int(ac2_z_ind), int(ac2_t_ind)] += 1
-
-            cursor += INITIAL_DIM * WAYPOINT_BYTE_SIZE
-
-        # count update waypoints
-        for ac in ac_ids:
-            num_updates = int.from_bytes(enc_data[cursor:cursor+NUM_UPDATE_BYTE_SIZE], byteorder='little')
-            cursor += NUM_UPDATE_BYTE_SIZE
-
-            for i in range(num_updates): 
-                [time,x,y,z] = struct.unpack('dddd', enc_data[cursor:cursor+(WAYPOINT_BYTE_SIZE*UPDATE_DIM)])
-                x, y = x*FT_TO_NM, y*FT_TO_NM
-
-                if ac == 1:
-                    ac1_x_ind = (x - ac1_x_minmax[0]) // ac1_x_bin_width
-                    ac1_y_ind = (y - ac1_y_minmax[0]) // ac1_y_bin_width 
-                    ac1_t_ind = (time - ac1_t_minmax[0]) // ac1_t_bin_width
-                    ac1_z_ind = (z - ac1_z_minmax[0]) // ac1_z_bin_width 
-                    
-                    ac_1_xy_bin_counts[int(ac1_y_ind), int(ac1_x_ind)] += 1
-                    ac_1_tz_bin_counts[int(ac1_z_ind), int(ac1_t_ind)] += 1
-
-                elif ac == 2:   
-                    ac2_x_ind = (x - ac2_x_minmax[0]) // ac2_x_bin_width   
-                    ac2_y_ind = (y - ac2_y_minmax[0]) // ac2_y_bin_width 
-                    ac2_t_ind = (time - ac2_t_minmax[0]) // ac2_t_bin_width
-                    ac2_z_ind = (z - ac2_z_minmax[0]) // ac2_z_bin_width 
-
-                    ac_2_xy_bin_counts[int(ac2_y_ind), int(ac2_x_ind)] += 1
-                    ac_2_tz_bin_counts[int(ac2_z_ind), int(ac2_t_ind)] += 1
-
-                cursor += UPDATE_DIM * WAYPOINT_BYTE_SIZE
-    
-    return ac_1_xy_bin_counts, ac_1_tz_bin_counts, ac_2_xy_bin_counts, ac_2_tz_bin_counts,\
-        ac1_t_edges, ac1_x_edges, ac1_y_edges, ac1_z_edges,\
-        ac2_t_edges, ac2_x_edges, ac2_y_edges, ac2_z_edges
+'''
+    Returns the GaussianSampler for one aircraft's nominal path (a list of [x, y, z]
+    waypoints). Diagonal covariances use sigma_hor/sigma_ver as the variance of every
+    horizontal/vertical coordinate, exponential kernels use exp_kernel_func.
+'''
+def create_ac_sampler(ac_kernel_inputs, cov_radio_value, sigma_hor, sigma_ver, exp_kernel_a, exp_kernel_b, exp_kernel_c):
+    if cov_radio_value == 'cov-radio-diag':
+        mean = np.asarray(ac_kernel_inputs, dtype=float).ravel()
+        return GaussianSampler(mean, variances=np.tile([sigma_hor, sigma_hor, sigma_ver], len(ac_kernel_inputs)))
+
+    mean, cov = exp_kernel_func(ac_kernel_inputs, exp_kernel_a, exp_kernel_b, exp_kernel_c)
+    return GaussianSampler(mean, cov=cov)
+
+
+def nominal_encounter_chunk(kernel_inputs):
+    return [np.asarray(ac_kernel_inputs, dtype=float)[None] for ac_kernel_inputs in kernel_inputs]
+
+
+'''
+    Yields num_samples sampled encounters as a list with one (chunk_size, num_waypoints, 3)
+    array per aircraft, chunk_size encounters at a time, so only one chunk of samples
+    is held in memory at a time.
+'''
+def generate_encounter_chunks(samplers, num_samples, rng, chunk_size=GENERATION_CHUNK_SIZE):
+    for start in range(0, num_samples, chunk_size):
+        num_chunk_samples = min(chunk_size, num_samples-start)
+        yield [sampler.sample(num_chunk_samples, rng).reshape((num_chunk_samples, -1, 3)) for sampler in samplers]
+
+
+'''
+    Encodes a chunk of encounters into a structured array with the .dat layout of
+    encounter_dtype, filling it one field at a time. out is reused when it is large
+    enough so that consecutive chunks share a single buffer.
+'''
+def encode_encounter_chunk(chunk, ac_times, out=None):
+    num_chunk_encounters = chunk[0].shape[0]
+    enc_dtype = encounter_dtype([ac_chunk.shape[1]-1 for ac_chunk in chunk])
+
+    if out is None or out.dtype != enc_dtype or len(out) < num_chunk_encounters:
+        out = np.empty(num_chunk_encounters, dtype=enc_dtype)
+    enc_buffer = out[:num_chunk_encounters]
+
+    for ac, ac_chunk in enumerate(chunk):
+        initial = enc_buffer['initial'][:, ac]
+        initial['xEast'] = ac_chunk[:, 0, 0] * NM_TO_FT
+        initial['yNorth'] = ac_chunk[:, 0, 1] * NM_TO_FT
+        initial['zUp'] = ac_chunk[:, 0, 2]
+
+        enc_buffer[f'num_updates_{ac}'] = ac_chunk.shape[1]-1
+
+        updates = enc_buffer[f'updates_{ac}']
+        updates['time'] = np.asarray(ac_times[ac][1:], dtype=float)
+        updates['xEast'] = ac_chunk[:, 1:, 0] * NM_TO_FT
+        updates['yNorth'] = ac_chunk[:, 1:, 1] * NM_TO_FT
+        updates['zUp'] = ac_chunk[:, 1:, 2]
+
+    return enc_buffer
+
+
+'''
+    Histogram range of a generated set, known before any encounter is sampled: the
+    nominal paths widened by HISTOGRAM_SIGMA_RANGE standard deviations of their
+    sampling distributions, and the exact range of the waypoint times. All aircraft
+    share one range so that their histograms are comparable, it is returned as the
+    [min, max] pair of [time, x, y, z] vectors of each aircraft.
+'''
+def generation_minmax_hist(samplers, ac_times):
+    # initial waypoints are stored with time 0
+    waypoint_times = np.concatenate([np.append(0., np.asarray(ac_time[1:], dtype=float)) for ac_time in ac_times])
+    mean = np.concatenate([sampler.mean for sampler in samplers]).reshape((-1, 3))
+    spread = HISTOGRAM_SIGMA_RANGE * np.concatenate([sampler.marginal_std for sampler in samplers]).reshape((-1, 3))
+
+    ac_min = np.append(waypoint_times.min(), (mean-spread).min(axis=0))
+    ac_max = np.append(waypoint_times.max(), (mean+spread).max(axis=0))
+
+    return [[ac_min, ac_max] for _ in samplers]
+
+
+'''
+    Encodes the chunks of generated_chunks and appends them to file, counting their
+    waypoints into histograms on the way. Returns the byte size of every encounter.
+    Raises JobCancelled between two chunks once should_stop() returns True.
+'''
+def stream_encounter_chunks(file, generated_chunks, ac_times, histograms, should_stop=None):
+    # initial waypoints are stored with time 0
+    waypoint_times = [np.append(0., np.asarray(ac_time[1:], dtype=float)) for ac_time in ac_times]
+
+    enc_byte_sizes = [np.empty(0, dtype=np.uint64)]
+    enc_buffer = None
+    for chunk in generated_chunks:
+        if should_stop is not None and should_stop():
+            raise JobCancelled()
+
+        enc_buffer = encode_encounter_chunk(chunk, ac_times, out=enc_buffer)
+        file.write(enc_buffer.view(np.uint8))
+        num_chunk_encounters = len(enc_buffer)
+
+        enc_byte_sizes.append(np.full(num_chunk_encounters, enc_buffer.dtype.itemsize, dtype=np.uint64))
+        histograms.add(*stack_ac_waypoints([(np.tile(waypoint_times[ac], num_chunk_encounters), *ac_chunk.reshape((-1, 3)).T)
+                                            for ac, ac_chunk in enumerate(chunk)]))
+
+    return np.concatenate(enc_byte_sizes)
+
+
+def segment_filepath(filename, shard):
+    return f'{filename}.shard{shard}'
+
+
+'''
+    Worker side of stream_generated_data: samples the num_samples encounters of one
+    shard from its own random stream, writes them to segment_filename (encounter
+    blocks only, no header) and returns their byte sizes and histograms.
+'''
+def generate_shard(samplers, ac_times, num_samples, seed_sequence, segment_filename, minmax_hist, should_stop=None):
+    rng = np.random.default_rng(seed_sequence)
+    histograms = EncounterHistograms(minmax_hist)
+
+    try:
+        with open(segment_filename, mode='wb') as file:
+            enc_byte_sizes = stream_encounter_chunks(file, generate_encounter_chunks(samplers, num_samples, rng), ac_times, histograms, should_stop)
+    except JobCancelled:
+        if os.path.exists(segment_filename):
+            os.remove(segment_filename)
+        raise
+
+    return enc_byte_sizes, histograms
+
+
+def new_generation_seed():
+    return secrets.randbits(32)
+
+
+'''
+    Generates num_encounters encounters around the nominal paths in kernel_inputs and
+    streams them to filename, preceded by the nominal encounter. The encounters are
+    split into shards of GENERATION_SHARD_SIZE that are sampled in parallel on the
+    application executor, each from its own child of numpy.random.SeedSequence(seed),
+    and written to segment files that are stitched together in shard order. Since
+    the shards, and the chunks within them, do not depend on the number of workers,
+    a given seed always produces the same file. The waypoints are counted into
+    histograms with the fixed range minmax_hist as they are generated, so the file
+    does not have to be read back to plot them.
+    The file is written as filename.part and only renamed to filename once it is
+    complete. progress_callback(bytes_written, total_bytes) is called while waiting
+    for the shards. Once should_stop() returns True the shards stop after their
+    current chunk, and once all of them have stopped the partial file is removed and
+    JobCancelled is raised.
+'''
+def stream_generated_data(samplers, kernel_inputs, ac_times, filename, num_encounters, minmax_hist, seed, 
+                          progress_callback=None, should_stop=None):
+    num_ac = len(ac_times)
+    enc_byte_size = encounter_dtype([len(ac_time)-1 for ac_time in ac_times]).itemsize
+    total_bytes = 2 * INFO_BYTE_SIZE + (num_encounters+1) * enc_byte_size
+
+    shard_sizes = [min(GENERATION_SHARD_SIZE, num_encounters-start) for start in range(0, num_encounters, GENERATION_SHARD_SIZE)]
+    shard_seeds = np.random.SeedSequence(seed).spawn(len(shard_sizes))
+    part_filename = partial_filepath(filename)
+    segment_filenames = [segment_filepath(part_filename, shard) for shard in range(len(shard_sizes))]
+
+    executor = get_executor()
+    shard_futures = [executor.submit(generate_shard, samplers, ac_times, num_samples, shard_seed, segment_filename, minmax_hist, should_stop)
+                        for num_samples, shard_seed, segment_filename in zip(shard_sizes, shard_seeds, segment_filenames)]
+
+    histograms = EncounterHistograms(minmax_hist)
+
+    completed = False
+    try:
+        with open(part_filename, mode='wb') as file:
+            file.write(struct.pack('<II', num_encounters+1, num_ac))
+            enc_byte_sizes = [stream_encounter_chunks(file, [nominal_encounter_chunk(kernel_inputs)], ac_times, histograms)]
+
+            for shard, (shard_future, segment_filename) in enumerate(zip(shard_futures, segment_filenames)):
+                while True:
+                    try:
+                        shard_enc_byte_sizes, shard_histograms = shard_future.result(timeout=JOB_PROGRESS_INTERVAL)
+                        break
+                    except concurrent.futures.TimeoutError:
+                        if should_stop is not None and should_stop():
+                            raise JobCancelled()
+                        if progress_callback is not None:
+                            # segments of the shards still running grow as their chunks are written
+                            bytes_written = file.tell() + sum(os.path.getsize(pending_filename) for pending_filename in segment_filenames[shard:]
+                                                                if os.path.exists(pending_filename))
+                            progress_callback(bytes_written, total_bytes)
+
+                enc_byte_sizes.append(shard_enc_byte_sizes)
+                histograms.merge(shard_histograms)
+
+                with open(segment_filename, mode='rb') as segment_file:
+                    shutil.copyfileobj(segment_file, file, SEGMENT_COPY_BYTE_SIZE)
+                os.remove(segment_filename)
+        completed = True
+    finally:
+        # shards that have not started are dropped, the running ones stop after their
+        # current chunk once the job is cancelled, their segments are removed after them
+        for shard_future in shard_futures:
+            shard_future.cancel()
+        concurrent.futures.wait(shard_futures)
+        for segment_filename in segment_filenames:
+            if os.path.exists(segment_filename):
+                os.remove(segment_filename)
+        if not completed and os.path.exists(part_filename):
+            os.remove(part_filename)
+
+    enc_data_indices = np.empty(num_encounters+2, dtype=np.uint64)
+    enc_data_indices[0] = 2 * INFO_BYTE_SIZE
+    np.cumsum(np.concatenate(enc_byte_sizes), out=enc_data_indices[1:])
+    enc_data_indices[1:] += enc_data_indices[0]
+
+    commit_workspace_file(filename)
+    write_encounter_index(filename, enc_data_indices, num_ac, num_encounters+1)
+    if progress_callback is not None:
+        progress_callback(total_bytes, total_bytes)
+
+    return enc_data_indices, histograms
+
+
+'''
+    Background job behind the generate button: generates the encounter set into the
+    workspace file filename (relative to file_path), registers it and returns the
+    contents of the generated-data store.
+'''
+def run_generation_job(job, samplers, kernel_inputs, ac_times, file_path, filename, num_encounters, minmax_hist, seed, nom_ac_ids):
+    start = time.time()
+
+    enc_data_indices, histograms = stream_generated_data(samplers, kernel_inputs, ac_times, file_path + filename, num_encounters, minmax_hist, seed,
+                                                         progress_callback=lambda bytes_written, total_bytes: job.report_progress(100 * bytes_written / total_bytes, 'Generating encounters'),
+                                                         should_stop=job.should_stop)
+    print(f'finished generating and streaming encounters in {(time.time()-start)/60:.6f} mins.\n')
+
+    return {'handle': register_dataset(enc_data_indices, histograms=histogram_outputs(histograms)),
+            'filename': filename,
+            'minmax_hist': np.asarray(minmax_hist).tolist(),
+            'ac_ids': nom_ac_ids,
+            'num_encounters': num_encounters+1, #include nominal path
+            'seed': seed,
+            'type': 'generated'}
+
+
+'''
+    Counts the xy and tz histograms of every aircraft over the first num_encounters
+    encounters of a generated file, binning whole chunks of waypoints at a time.
+'''
+def stream_count_histograms(filename, enc_indices, minmax_hist, num_encounters, ac_ids):
+    histograms = EncounterHistograms(minmax_hist)
+
+    for chunk_waypoints in iter_encounter_waypoint_chunks(filename, enc_indices, num_encounters, len(ac_ids)):
+        histograms.add(*chunk_waypoints)
+
+    return histogram_outputs(histograms)
+
+
+'''
+    Splits EncounterHistograms into one (xy bin counts, tz bin counts, t edges, x edges,
+    y edges, z edges) tuple per aircraft, what on_generation_update_log_histograms plots.
+'''
+def histogram_outputs(histograms):
+    return [histograms.results(ac) for ac in range(histograms.num_ac)]
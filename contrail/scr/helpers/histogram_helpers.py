@@ -0,0 +1,144 @@
+import numpy as np
+import plotly.graph_objs as go
+
+from helpers.constants import *
+from helpers.encounter_file_helpers import *
+from helpers.parse_encounter_helpers import *
+
+
+class EncounterHistograms:
+    '''
+        Accumulates the xEast/yNorth and time/zUp 2d histograms of every aircraft of
+        a set. minmax_hist holds one [min, max] pair of [time, x, y, z] vectors per
+        aircraft, each axis is split into NUM_BINS_HISTOGRAM bins of equal width
+        starting at its min. A point in bin floor((v - min) / width) is counted in an
+        (NUM_BINS_HISTOGRAM+1) x (NUM_BINS_HISTOGRAM+1) array indexed [y, x] (or [z, t]),
+        so points exactly at the max land in the extra last bin. Points outside
+        [min, max] are counted in the first/last bin and an axis of zero width puts
+        every point in bin 0. The counts of all aircraft are stacked along the first
+        axis and binned together with a single np.bincount per histogram type.
+    '''
+    def __init__(self, minmax_hist):
+        self.num_bins = NUM_BINS_HISTOGRAM + 1
+        self.minmax_hist = np.asarray(minmax_hist, dtype=float).reshape((-1, 2, 4))
+        self.num_ac = self.minmax_hist.shape[0]
+
+        self.mins = self.minmax_hist[:, 0]
+        self.bin_widths = (self.minmax_hist[:, 1]-self.minmax_hist[:, 0]) / NUM_BINS_HISTOGRAM
+        self.edges = np.linspace(self.minmax_hist[:, 0], self.minmax_hist[:, 1], num=NUM_BINS_HISTOGRAM+1, endpoint=True, axis=-1)
+
+        self.xy_bin_counts = np.zeros((self.num_ac, self.num_bins, self.num_bins))
+        self.tz_bin_counts = np.zeros((self.num_ac, self.num_bins, self.num_bins))
+
+    def _bin_indices(self, ac, waypoints):
+        bin_widths = self.bin_widths[ac]
+        zero_width = bin_widths == 0
+        bin_indices = np.floor_divide(waypoints - self.mins[ac], np.where(zero_width, 1, bin_widths))
+        bin_indices[zero_width] = 0
+        return np.clip(bin_indices, 0, self.num_bins-1).astype(np.intp)
+
+    def _count(self, ac, row_indices, col_indices):
+        return np.bincount((ac*self.num_bins + row_indices)*self.num_bins + col_indices,
+                            minlength=self.num_ac*self.num_bins*self.num_bins).reshape((self.num_ac, self.num_bins, self.num_bins))
+
+    '''
+        Counts waypoints given as an array of aircraft positions (in minmax_hist) and
+        the matching time, xEast (NM), yNorth (NM) and zUp (ft) arrays.
+    '''
+    def add(self, ac, time, x, y, z):
+        ac = np.asarray(ac, dtype=np.intp)
+        t_ind, x_ind, y_ind, z_ind = self._bin_indices(ac, np.stack((time, x, y, z), axis=-1)).T
+
+        self.xy_bin_counts += self._count(ac, y_ind, x_ind)
+        self.tz_bin_counts += self._count(ac, z_ind, t_ind)
+
+    '''
+        Adds the counts of other, a set of histograms with the same range (e.g. counted
+        over another part of the same encounter set).
+    '''
+    def merge(self, other):
+        self.xy_bin_counts += other.xy_bin_counts
+        self.tz_bin_counts += other.tz_bin_counts
+
+    '''
+        Returns the xy and tz bin counts followed by the [t, x, y, z] edges of aircraft ac.
+    '''
+    def results(self, ac):
+        return (self.xy_bin_counts[ac], self.tz_bin_counts[ac], *self.edges[ac])
+
+
+'''
+    Stacks per aircraft (time, xEast, yNorth, zUp) arrays into flat arrays tagged with
+    the aircraft position, the input of EncounterHistograms.add.
+'''
+def stack_ac_waypoints(ac_waypoints):
+    ac = np.repeat(np.arange(len(ac_waypoints)), [len(waypoints[0]) for waypoints in ac_waypoints])
+    return (ac, *(np.concatenate([waypoints[dim] for waypoints in ac_waypoints]) for dim in range(4)))
+
+
+def _structured_chunk_waypoints(chunk, num_ac):
+    chunk_waypoints = []
+    for ac in range(num_ac):
+        initial = chunk['initial'][:, ac]
+        updates = chunk[f'updates_{ac}']
+        chunk_waypoints.append((np.concatenate((np.zeros(len(chunk)), updates['time'].ravel())),
+                                np.concatenate((initial['xEast'], updates['xEast'].ravel())) * FT_TO_NM,
+                                np.concatenate((initial['yNorth'], updates['yNorth'].ravel())) * FT_TO_NM,
+                                np.concatenate((initial['zUp'], updates['zUp'].ravel()))))
+    return stack_ac_waypoints(chunk_waypoints)
+
+
+def _decoded_chunk_waypoints(enc_file, enc_indices, enc_ids, num_ac):
+    enc_columns = [decode_encounter(enc_file.encounter(enc_id, enc_indices), list(range(num_ac))) for enc_id in enc_ids]
+    enc_columns = {key: np.concatenate([columns[key] for columns in enc_columns]) for key in ['ac_id', 'time', 'xEast', 'yNorth', 'zUp']}
+
+    return enc_columns['ac_id'], enc_columns['time'], enc_columns['xEast'], enc_columns['yNorth'], enc_columns['zUp']
+
+
+'''
+    Yields the waypoints of encounters 0 .. num_encounters-1 of filename, chunk_size
+    encounters at a time, as flat (aircraft position, time, xEast, yNorth, zUp)
+    arrays. Runs of encounters sharing the layout of the first encounter
+    (every encounter of a generated file) are read as a structured array straight
+    from the mapping, other chunks are decoded encounter by encounter.
+'''
+def iter_encounter_waypoint_chunks(filename, enc_indices, num_encounters, num_ac, chunk_size=HISTOGRAM_CHUNK_SIZE):
+    if num_encounters == 0:
+        return
+
+    enc_file = get_encounter_file(filename)
+    num_updates = encounter_num_updates(enc_file.encounter(0, enc_indices), num_ac)
+    enc_dtype = encounter_dtype(num_updates)
+    enc_starts = np.asarray(enc_indices[:num_encounters+1], dtype=np.int64)
+
+    for start in range(0, num_encounters, chunk_size):
+        end = min(start+chunk_size, num_encounters)
+        chunk_start = int(enc_starts[start])
+
+        chunk = None
+        if np.all(np.diff(enc_starts[start:end+1]) == enc_dtype.itemsize) and chunk_start + (end-start)*enc_dtype.itemsize <= enc_file.size:
+            chunk = np.frombuffer(enc_file.buffer, dtype=enc_dtype, count=end-start, offset=chunk_start)
+            if not all(np.all(chunk[f'num_updates_{ac}'] == ac_num_updates) for ac, ac_num_updates in enumerate(num_updates)):
+                chunk = None
+
+        if chunk is not None:
+            yield _structured_chunk_waypoints(chunk, num_ac)
+        else:
+            yield _decoded_chunk_waypoints(enc_file, enc_indices, range(start, end), num_ac)
+
+
+def create_histogram(bin_counts, x_label, y_label, x_axes, y_axes):
+    if x_label == 'xEast' and y_label == 'yNorth':
+        return {
+            'data': [go.Heatmap(z=bin_counts, x=x_axes, y=y_axes, 
+                                colorscale=[[0,'#2c3e50'], 
+                                            [1,'#ffffff']])],
+            'layout': go.Layout(xaxis_title="xEast (NM)", yaxis_title="yNorth (NM)")
+        }
+    if x_label == 'time' and y_label == 'zUp':
+        return {
+            'data': [go.Heatmap(z=bin_counts, x=x_axes, y=y_axes,
+                                colorscale=[[0,'#2c3e50'], 
+                                            [1,'#ffffff']])],
+            'layout': go.Layout(xaxis_title="Time (s)", yaxis_title="zUp (ft)")
+        }
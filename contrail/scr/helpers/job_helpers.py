@@ -0,0 +1,269 @@
+import os
+import json
+import time
+import pickle
+import uuid
+import shutil
+import threading
+import traceback
+
+from helpers.constants import *
+
+'''
+    Local background job queue. Long callbacks submit their work with submit_job and
+    return right away, a dcc.Interval then polls read_job_status until the job is
+    finished. Every job has a directory under JOB_DIRECTORY holding its status.json
+    (state, progress, message, result or error) and, once cancel_job is called, a
+    cancel marker file. Until it starts a job also keeps its pickled function and
+    arguments there, so the queue lives on disk: JOB_MAX_RUNNING worker threads in
+    every server process that submits or polls jobs claim the oldest queued job by
+    renaming its spec, and jobs queued before a restart are picked up once the new
+    server handles its first job request. Their heavy lifting goes to the
+    application executor. A job that was already running when its server process
+    stopped is not restarted, it is reported as failed.
+'''
+JOB_STATUS_FILENAME = 'status.json'
+JOB_CANCEL_FILENAME = 'cancel'
+JOB_SPEC_FILENAME = 'spec.pkl'
+JOB_CLAIMED_EXTENSION = '.claimed'
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+JOB_FINISHED_STATES = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+_job_status_lock = threading.Lock()
+_job_workers_lock = threading.Lock()
+_job_workers_pid = None
+_job_queued = threading.Event()
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class CancelMarker:
+    '''
+        should_stop callable of a job: True once the job's cancel marker exists.
+        Only holds a path, so it can be handed to work running in other processes.
+    '''
+    def __init__(self, job_id):
+        self.filepath = os.path.join(job_dirpath(job_id), JOB_CANCEL_FILENAME)
+
+    def __call__(self):
+        return os.path.exists(self.filepath)
+
+
+class JobContext:
+    '''
+        Handed to a job function as its first argument to report progress (0-100).
+        Its should_stop callable tells whether the job has been cancelled.
+    '''
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.should_stop = CancelMarker(job_id)
+        self._last_report = 0.
+
+    def report_progress(self, progress, message=None):
+        now = time.time()
+        if now - self._last_report < JOB_PROGRESS_INTERVAL and progress < 100:
+            return
+        self._last_report = now
+        write_job_status(self.job_id, progress=min(max(float(progress), 0.), 100.), message=message)
+
+
+def job_dirpath(job_id):
+    return os.path.join(JOB_DIRECTORY, job_id)
+
+
+'''
+    Updates fields of the status.json of job_id. The file is replaced atomically so
+    that a poll never reads a half written status.
+'''
+def write_job_status(job_id, **fields):
+    status_filepath = os.path.join(job_dirpath(job_id), JOB_STATUS_FILENAME)
+
+    with _job_status_lock:
+        status = read_job_status(job_id) or {'job_id': job_id}
+        status.update(fields)
+        status['updated'] = time.time()
+
+        tmp_filepath = status_filepath + '.tmp'
+        with open(tmp_filepath, 'w') as file:
+            json.dump(status, file)
+        os.replace(tmp_filepath, status_filepath)
+
+
+'''
+    Returns the status dict of job_id, or None if there is no such job. A job that
+    is still queued or running although the server process that ran it is gone is
+    reported as failed. Polling a job starts the job workers of this process, which
+    picks up jobs queued before a restart.
+'''
+def read_job_status(job_id):
+    start_job_workers()
+    status_filepath = os.path.join(job_dirpath(job_id), JOB_STATUS_FILENAME)
+    try:
+        with open(status_filepath) as file:
+            status = json.load(file)
+    except (OSError, ValueError):
+        return None
+
+    if status.get('state') not in JOB_FINISHED_STATES and not _process_alive(status.get('pid')):
+        status['state'] = JOB_FAILED
+        status['error'] = 'server process running the job has stopped'
+    return status
+
+
+def _process_alive(pid):
+    if pid is None or pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+'''
+    Queues func(job_context, *args, **kwargs) as a background job of the given kind
+    and returns its job id. func must be a module level function and its arguments
+    picklable, they are saved with the job until a worker picks it up. The value
+    func returns must be json serializable, it is stored as the job result.
+'''
+def submit_job(kind, func, *args, **kwargs):
+    job_id = uuid.uuid4().hex
+    os.makedirs(job_dirpath(job_id), exist_ok=True)
+    # no process owns a queued job, the worker that claims it sets its pid
+    write_job_status(job_id, kind=kind, state=JOB_QUEUED, progress=0., message=None,
+                     result=None, error=None, pid=None, created=time.time())
+
+    spec_filepath = os.path.join(job_dirpath(job_id), JOB_SPEC_FILENAME)
+    with open(spec_filepath + '.tmp', 'wb') as file:
+        pickle.dump((func, args, kwargs), file)
+    os.replace(spec_filepath + '.tmp', spec_filepath)
+
+    start_job_workers()
+    _job_queued.set()
+    return job_id
+
+
+'''
+    Starts the job worker threads of this server process, if they are not running
+    yet (a forked server process starts its own).
+'''
+def start_job_workers():
+    global _job_workers_pid
+
+    with _job_workers_lock:
+        if _job_workers_pid == os.getpid():
+            return
+        _job_workers_pid = os.getpid()
+        for i in range(JOB_MAX_RUNNING):
+            threading.Thread(target=_job_worker, name=f'contrail-job-{i}', daemon=True).start()
+
+
+def _job_worker():
+    while True:
+        claimed = _claim_queued_job()
+        if claimed is None:
+            _job_queued.wait(JOB_QUEUE_POLL_INTERVAL)
+            _job_queued.clear()
+            continue
+
+        try:
+            _run_job(*claimed)
+        except Exception:
+            traceback.print_exc()
+
+
+'''
+    Claims the oldest queued job by renaming its spec, which only one worker (of any
+    server process) can do, and returns its id and spec path, or None if no job is
+    waiting.
+'''
+def _claim_queued_job():
+    spec_filepaths = []
+    try:
+        with os.scandir(JOB_DIRECTORY) as job_entries:
+            for entry in job_entries:
+                spec_filepath = os.path.join(entry.path, JOB_SPEC_FILENAME)
+                try:
+                    spec_filepaths.append((os.stat(spec_filepath).st_mtime, entry.name, spec_filepath))
+                except OSError:
+                    continue
+    except FileNotFoundError:
+        return None
+
+    for _, job_id, spec_filepath in sorted(spec_filepaths):
+        try:
+            os.rename(spec_filepath, spec_filepath + JOB_CLAIMED_EXTENSION)
+        except OSError:
+            continue
+        write_job_status(job_id, pid=os.getpid())
+        return job_id, spec_filepath + JOB_CLAIMED_EXTENSION
+    return None
+
+
+def _run_job(job_id, spec_filepath):
+    job = JobContext(job_id)
+    if job.should_stop():
+        os.remove(spec_filepath)
+        write_job_status(job_id, state=JOB_CANCELLED)
+        return
+
+    try:
+        with open(spec_filepath, 'rb') as file:
+            func, args, kwargs = pickle.load(file)
+        os.remove(spec_filepath)
+    except Exception as e:
+        traceback.print_exc()
+        write_job_status(job_id, state=JOB_FAILED, error=f'could not load the job: {e}')
+        return
+
+    write_job_status(job_id, state=JOB_RUNNING)
+    try:
+        result = func(job, *args, **kwargs)
+    except JobCancelled:
+        print('Job', job_id, 'cancelled.')
+        write_job_status(job_id, state=JOB_CANCELLED)
+    except Exception as e:
+        traceback.print_exc()
+        write_job_status(job_id, state=JOB_FAILED, error=str(e))
+    else:
+        write_job_status(job_id, state=JOB_DONE, progress=100., result=result)
+
+
+def cancel_job(job_id):
+    if os.path.isdir(job_dirpath(job_id)):
+        open(CancelMarker(job_id).filepath, 'w').close()
+
+
+'''
+    Returns the first of the job stores jobs ({'job_id': ...} or empty) whose status can
+    be read, together with that status, or (None, None). That is the job the status
+    bar shows and the one its cancel button cancels.
+'''
+def shown_job(*jobs):
+    for job in jobs:
+        if job:
+            status = read_job_status(job['job_id'])
+            if status is not None:
+                return job, status
+    return None, None
+
+
+'''
+    Deletes the directory of a finished job once its result has been picked up. The
+    directory (with the cancel marker the job's workers poll) is kept as long as the
+    job function has not returned.
+'''
+def remove_job(job_id):
+    status = read_job_status(job_id)
+    if status is not None and status['state'] not in JOB_FINISHED_STATES:
+        return
+    shutil.rmtree(job_dirpath(job_id), ignore_errors=True)
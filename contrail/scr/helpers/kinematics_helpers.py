@@ -0,0 +1,70 @@
+import numpy as np
+
+from helpers.constants import *
+from helpers.resample_helpers import *
+
+'''
+    Horizontal speed (kt), vertical speed (ft/min), heading (deg) and turn rate (deg
+    per waypoint) of trajectories packed one after the other in flat arrays, sorted by
+    trajectory and time. Every waypoint gets the quantities of the step from the
+    waypoint before it, the first waypoint of a trajectory gets 0, and the turn rate
+    is the change of heading between two consecutive steps (0 for the first two
+    waypoints). All trajectories are handled with the same array differences, grouped
+    by a mask of the waypoints that start a trajectory.
+'''
+KINEMATICS_KEYS = ['horizontal_speed', 'vertical_speed', 'heading', 'turn_rate']
+
+
+'''
+    Mask of the waypoints that start a trajectory, where any of the (sorted) keys
+    changes from the waypoint before.
+'''
+def trajectory_starts(*keys):
+    starts = np.zeros(len(keys[0]), dtype=bool)
+    starts[:1] = True
+    for key in keys:
+        key = np.asarray(key)
+        starts[1:] |= key[1:] != key[:-1]
+    return starts
+
+
+'''
+    Kinematics of the packed trajectories, as a dict of arrays keyed by
+    KINEMATICS_KEYS. The heading is taken from the lat/long steps when they are
+    given (like the waypoints table does) and from the xEast/yNorth steps otherwise.
+'''
+def trajectory_kinematics(starts, times, xEast, yNorth, zUp, lat=None, long=None):
+    times, xEast, yNorth, zUp = (np.asarray(values, dtype=float) for values in (times, xEast, yNorth, zUp))
+    if lat is None or long is None:
+        east, north = xEast, yNorth
+    else:
+        east, north = np.asarray(long, dtype=float), np.asarray(lat, dtype=float)
+
+    kinematics = {key: np.zeros(len(times)) for key in KINEMATICS_KEYS}
+
+    # step k goes from waypoint k-1 to waypoint k of the same trajectory
+    k = np.flatnonzero(~starts)
+    time_steps = times[k] - times[k-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        kinematics['horizontal_speed'][k] = np.sqrt((xEast[k] - xEast[k-1]) ** 2 + (yNorth[k] - yNorth[k-1]) ** 2) / time_steps * 3600
+        kinematics['vertical_speed'][k] = (zUp[k] - zUp[k-1]) / time_steps * 60
+
+    angle = np.arctan2(north[k] - north[k-1], east[k] - east[k-1]) * 180 / np.pi
+    kinematics['heading'][k] = (90 - angle + 360) % 360
+
+    turning = k[~starts[k-1]]
+    kinematics['turn_rate'][turning] = (kinematics['heading'][turning] - kinematics['heading'][turning-1] + 180) % 360 - 180
+
+    return kinematics
+
+
+'''
+    Yields the encounters enc_ids (a range) of filename resampled every time_step
+    seconds (see resample_helpers.iter_resampled_encounter_chunks) with the
+    kinematics of every resampled waypoint, chunk_size encounters at a time.
+'''
+def iter_encounter_kinematics_chunks(filename, enc_indices, enc_ids, num_ac, time_step=RESAMPLE_TIME_STEP, chunk_size=RESAMPLE_CHUNK_SIZE):
+    for chunk in iter_resampled_encounter_chunks(filename, enc_indices, enc_ids, num_ac, time_step, chunk_size):
+        starts = trajectory_starts(chunk['encounter_id'], chunk['ac'])
+        chunk.update(trajectory_kinematics(starts, chunk['time'], chunk['xEast'], chunk['yNorth'], chunk['zUp']))
+        yield chunk
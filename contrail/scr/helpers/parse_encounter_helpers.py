@@ -1,144 +1,178 @@
-import struct
-import pymap3d as pm
-import base64
+import threading
+import concurrent.futures
+import numpy as np
 
 from helpers.constants import *
+from helpers.cache_helpers import *
+from helpers.encounter_file_helpers import *
+from helpers.dataset_registry_helpers import *
+from helpers.projection_helpers import *
+
+ENC_DATA_COLUMNS = ['encounter_id', 'ac_id', 'time', 'xEast', 'yNorth', 'lat', 'long', 'zUp']
+
+decoded_encounter_cache = LRUByteCache(ENCOUNTER_CACHE_BYTE_SIZE)
+
+_prefetch_runner = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='contrail-prefetch')
+_prefetch_lock = threading.Lock()
+_prefetch_pending = set()
 
 '''
-    Used when a user selects an enc from the dropdown and memory_data['type']
-    is either 'loaded' or 'generated'. The only difference between this function
-    and parse_enc_data_from_encounters_data is how the data is read in. In this func,
-    it is read in directly from the file.
+    Decodes a single encounter block (the bytes between two encounter byte indices)
+    into columnar arrays. Each aircraft contributes its initial waypoint (time 0)
+    followed by its update waypoints. xEast and yNorth are converted from ft to NM,
+    zUp stays in ft. Only the num_updates fields are visited one at a time, all of
+    the waypoints of an aircraft are read with a single np.frombuffer call.
 '''
-def parse_enc_data_from_filename(enc_ids_selected, enc_indices, encounters_filename, enc_ac_ids, ac_ids_selected, ref_data):
-    enc_data_list = []
+def decode_encounter(enc_data, enc_ac_ids):
+    num_ac = len(enc_ac_ids)
 
-    initial_dim, update_dim = 3, 4
-    num_update_byte_size, waypoint_byte_size = 2, 8
+    initial = np.frombuffer(enc_data, dtype=INITIAL_DTYPE, count=num_ac)
+    cursor = num_ac * INITIAL_DTYPE.itemsize
 
-    for enc_id in enc_ids_selected:
-        # print('** ENC_ID ', enc_id, '**')
-        with open(encounters_filename, 'rb') as file:
-            enc_start_ind = enc_indices[enc_id]
-            file.seek(enc_start_ind)
-            if enc_id+1 >= len(enc_indices):
-                enc_data = file.read()
-            else:
-                enc_end_ind = enc_indices[enc_id+1]
-                num_bytes = enc_end_ind - enc_start_ind
-                enc_data = file.read(num_bytes)
-
-        cursor = 0
-        for ac in enc_ac_ids:
-            [x,y,z] = struct.unpack('ddd', enc_data[cursor:cursor+(waypoint_byte_size*initial_dim)])
-            
-            if ac in ac_ids_selected:
-                data_point = {'encounter_id': enc_id, 'ac_id':ac, 'time':0,\
-                                'xEast':x*FT_TO_NM, 'yNorth':y*FT_TO_NM,\
-                                'lat':None, 'long': None, 'zUp':z,\
-                                'horizontal_speed':0, 'vertical_speed':0}
-
-                data_point['lat'], data_point['long'], _ = pm.enu2geodetic(data_point['xEast']*NM_TO_M, data_point['yNorth']*NM_TO_M, data_point['zUp']*FT_TO_M, 
-                                                                ref_data['ref_lat'], ref_data['ref_long'], ref_data['ref_alt']*FT_TO_M, 
-                                                                ell=pm.Ellipsoid('wgs84'), deg=True)
-                enc_data_list += [data_point]
-
-            cursor += (waypoint_byte_size*initial_dim)
-        
-        for ac in enc_ac_ids:
-            num_updates = int.from_bytes(enc_data[cursor:cursor+num_update_byte_size], byteorder='little')
-            # print('num_updates: ', num_updates)
-            cursor += num_update_byte_size
-            for i in range(num_updates): 
-                [time,x,y,z] = struct.unpack('dddd', enc_data[cursor:cursor+(waypoint_byte_size*update_dim)])
-
-                if ac in ac_ids_selected:
-                    data_point = {'encounter_id': enc_id, 'ac_id':ac, 'time':time,\
-                                    'xEast':x*FT_TO_NM, 'yNorth':y*FT_TO_NM,\
-                                    'lat':None, 'long': None, 'zUp':z,\
-                                    'horizontal_speed':0, 'vertical_speed':0}
-
-                    data_point['lat'], data_point['long'], _ = pm.enu2geodetic(data_point['xEast']*NM_TO_M, data_point['yNorth']*NM_TO_M, data_point['zUp']*FT_TO_M, 
-                                                                    ref_data['ref_lat'], ref_data['ref_long'], ref_data['ref_alt']*FT_TO_M, 
-                                                                    ell=pm.Ellipsoid('wgs84'), deg=True)
-                    enc_data_list += [data_point]
-
-                cursor += (waypoint_byte_size*update_dim)
-
-    # print('this took  ', time.time() - start)
-    return enc_data_list
-
-
-'''
-    Used when a user selects an enc from the dropdown and memory_data['type']
-    is either 'created' or 'json'. The only difference between this function
-    and parse_enc_data_from_filename is how the data is read in. In this func,
-    it is read in directly from the the stored memory_data['encounters_data']
-    which is a base64 encoded string.
-'''
-def parse_enc_data_from_encounters_data(enc_ids_selected, enc_indices, encounters_data, enc_ac_ids, ac_ids_selected, ref_data):
-    if encounters_data[0:2] == 'b\'':
-        encounters_data = encounters_data[2:-1]
-        difference = len(encounters_data) % 4
-        padding = '=' * difference
-        encounters_data += padding
-
-    decoded = base64.b64decode(encounters_data)
-
-    enc_data_list = []
-
-    initial_dim, update_dim = 3, 4
-    num_update_byte_size, waypoint_byte_size = 2, 8
+    updates = []
+    for _ in range(num_ac):
+        num_updates = int(np.frombuffer(enc_data, dtype=NUM_UPDATE_DTYPE, count=1, offset=cursor)[0])
+        cursor += NUM_UPDATE_BYTE_SIZE
+        updates.append(np.frombuffer(enc_data, dtype=UPDATE_DTYPE, count=num_updates, offset=cursor))
+        cursor += num_updates * UPDATE_DTYPE.itemsize
 
-    for enc_id in enc_ids_selected:
+    counts = [len(ac_updates)+1 for ac_updates in updates]
+
+    return {'ac_id': np.repeat(np.asarray(enc_ac_ids), counts),
+            'time': np.concatenate([np.append(0., ac_updates['time']) for ac_updates in updates]),
+            'xEast': np.concatenate([np.append(initial['xEast'][i], ac_updates['xEast']) for i, ac_updates in enumerate(updates)]) * FT_TO_NM,
+            'yNorth': np.concatenate([np.append(initial['yNorth'][i], ac_updates['yNorth']) for i, ac_updates in enumerate(updates)]) * FT_TO_NM,
+            'zUp': np.concatenate([np.append(initial['zUp'][i], ac_updates['zUp']) for i, ac_updates in enumerate(updates)])}
+
+
+'''
+    Projects every waypoint of a decoded encounter onto lat/long around the
+    reference point in one call.
+'''
+def project_encounter(enc_columns, ref_data):
+    lat, long, _ = enu_to_geodetic(enc_columns['xEast'], enc_columns['yNorth'], enc_columns['zUp'], ref_data)
+    return dict(enc_columns, lat=np.atleast_1d(lat), long=np.atleast_1d(long))
+
+
+'''
+    Selects the waypoints of the aircraft in ac_ids_selected out of a projected
+    encounter and tags them with the encounter id.
+'''
+def select_encounter(enc_columns, enc_id, ac_ids_selected):
+    mask = np.isin(enc_columns['ac_id'], ac_ids_selected)
+    columns = {key: values[mask] for key, values in enc_columns.items()}
+    columns['encounter_id'] = np.full(len(columns['ac_id']), enc_id)
+
+    return columns
+
+
+'''
+    Stacks the columnar data of several encounters into one set of columns.
+'''
+def concatenate_enc_columns(enc_columns_list):
+    if not enc_columns_list:
+        return {key: np.array([]) for key in ENC_DATA_COLUMNS}
+    return {key: np.concatenate([columns[key] for columns in enc_columns_list]) for key in ENC_DATA_COLUMNS}
+
+
+'''
+    Thin adapter from the columnar arrays to the list of waypoint dicts that
+    update_data_table and the rest of the callbacks work with.
+'''
+def enc_columns_to_records(columns):
+    num_waypoints = len(columns['ac_id'])
+    column_lists = {key: columns[key].tolist() for key in ENC_DATA_COLUMNS}
+
+    return [{'encounter_id': column_lists['encounter_id'][i], 'ac_id': column_lists['ac_id'][i], 'time': column_lists['time'][i],
+             'xEast': column_lists['xEast'][i], 'yNorth': column_lists['yNorth'][i],
+             'lat': column_lists['lat'][i], 'long': column_lists['long'][i], 'zUp': column_lists['zUp'][i],
+             'horizontal_speed': 0, 'vertical_speed': 0} for i in range(num_waypoints)]
+
+
+'''
+    Returns the bytes of encounter enc_id of the registered dataset behind memory_data.
+    For 'loaded' and 'generated' data they are read directly from the memory-mapped
+    file, for 'created' and 'json' data from the encoded encounters_data bytes kept
+    for the dataset in the dataset registry.
+'''
+def encounter_bytes(memory_data, dataset, enc_id, file_path):
+    enc_indices = dataset['encounter_indices']
+
+    if memory_data['type'] == 'created' or memory_data['type'] == 'json':
         enc_start_id = enc_indices[enc_id]
         if enc_id+1 >= len(enc_indices):
-            enc_data = decoded[enc_start_id:]
-        else:
-            enc_end_id = enc_indices[enc_id+1]
-            enc_data = decoded[enc_start_id:enc_end_id]
-
-        cursor = 0
-        for ac in enc_ac_ids:
-            [x,y,z] = struct.unpack('ddd', enc_data[cursor:cursor+(waypoint_byte_size*initial_dim)])
-            
-            if ac in ac_ids_selected:
-                data_point = {'encounter_id': enc_id, 'ac_id':ac, 'time':0,\
-                                'xEast':x*FT_TO_NM, 'yNorth':y*FT_TO_NM,\
-                                'lat':None, 'long': None, 'zUp':z,\
-                                'horizontal_speed':0, 'vertical_speed':0}
-
-                data_point['lat'], data_point['long'], _ = pm.enu2geodetic(data_point['xEast']*NM_TO_M, data_point['yNorth']*NM_TO_M, data_point['zUp']*FT_TO_M, 
-                                                                ref_data['ref_lat'], ref_data['ref_long'], ref_data['ref_alt']*FT_TO_M, 
-                                                                ell=pm.Ellipsoid('wgs84'), deg=True)
-                enc_data_list += [data_point]
-
-            cursor += (waypoint_byte_size*initial_dim)
-        
-        for ac in enc_ac_ids:
-            num_updates = int.from_bytes(enc_data[cursor:cursor+num_update_byte_size], byteorder='little')
-            cursor += num_update_byte_size
-            for i in range(num_updates): 
-                [time,x,y,z] = struct.unpack('dddd', enc_data[cursor:cursor+(waypoint_byte_size*update_dim)])
-
-                if ac in ac_ids_selected:
-                    data_point = {'encounter_id': enc_id, 'ac_id':ac, 'time':time,\
-                                    'xEast':x*FT_TO_NM, 'yNorth':y*FT_TO_NM,\
-                                    'lat':None, 'long': None, 'zUp':z,\
-                                    'horizontal_speed':0, 'vertical_speed':0}
-
-                    data_point['lat'], data_point['long'], _ = pm.enu2geodetic(data_point['xEast']*NM_TO_M, data_point['yNorth']*NM_TO_M, data_point['zUp']*FT_TO_M, 
-                                                                    ref_data['ref_lat'], ref_data['ref_long'], ref_data['ref_alt']*FT_TO_M, 
-                                                                    ell=pm.Ellipsoid('wgs84'), deg=True)
-                    enc_data_list += [data_point]
-
-                cursor += (waypoint_byte_size*update_dim)
-
-    return enc_data_list
+            return dataset['encounters_data'][enc_start_id:]
+        return dataset['encounters_data'][enc_start_id:enc_indices[enc_id+1]]
+
+    return get_encounter_file(file_path+memory_data['filename']).encounter(enc_id, enc_indices)
+
+
+def ref_point_key(ref_data):
+    return float(ref_data['ref_lat']), float(ref_data['ref_long']), float(ref_data['ref_alt'])
+
+
+'''
+    Decoded and projected columns of every aircraft of encounter enc_id, cached on
+    (dataset handle, encounter id, reference point).
+'''
+def projected_encounter(memory_data, dataset, enc_id, ref_data, file_path):
+    cache_key = (memory_data['handle'], enc_id, ref_point_key(ref_data))
+    enc_columns = decoded_encounter_cache.get(cache_key)
+    if enc_columns is None:
+        enc_columns = project_encounter(decode_encounter(encounter_bytes(memory_data, dataset, enc_id, file_path), memory_data['ac_ids']), ref_data)
+        decoded_encounter_cache.put(cache_key, enc_columns)
+    return enc_columns
+
+
+def valid_encounter_ids(memory_data):
+    # encounter ids of a loaded file start at 1
+    first_enc_id = 1 if memory_data['type'] == 'loaded' else 0
+    return range(first_enc_id, first_enc_id + memory_data['num_encounters'])
+
+
+'''
+    Decodes the ENCOUNTER_PREFETCH_RADIUS encounters before and after each of
+    enc_ids_selected in the background, so that stepping through a set finds
+    the next encounter already in decoded_encounter_cache.
+'''
+def prefetch_neighbour_encounters(memory_data, dataset, enc_ids_selected, ref_data, file_path):
+    enc_ids = valid_encounter_ids(memory_data)
+
+    for enc_id in enc_ids_selected:
+        for offset in range(1, ENCOUNTER_PREFETCH_RADIUS+1):
+            for neighbour_id in [enc_id+offset, enc_id-offset]:
+                cache_key = (memory_data['handle'], neighbour_id, ref_point_key(ref_data))
+                if neighbour_id not in enc_ids or cache_key in decoded_encounter_cache:
+                    continue
+
+                with _prefetch_lock:
+                    if cache_key in _prefetch_pending:
+                        continue
+                    _prefetch_pending.add(cache_key)
+                _prefetch_runner.submit(_prefetch_encounter, cache_key, memory_data, dataset, neighbour_id, ref_data, file_path)
+
+
+def _prefetch_encounter(cache_key, memory_data, dataset, enc_id, ref_data, file_path):
+    try:
+        projected_encounter(memory_data, dataset, enc_id, ref_data, file_path)
+    except Exception as e:
+        print('Could not prefetch encounter', enc_id, e)
+    finally:
+        with _prefetch_lock:
+            _prefetch_pending.discard(cache_key)
+
+
+def parse_enc_columns(memory_data, enc_ids_selected, ac_ids_selected, ref_data, file_path):
+    dataset = get_dataset(memory_data, file_path)
+    if dataset is None:
+        return concatenate_enc_columns([])
+
+    enc_columns_list = [select_encounter(projected_encounter(memory_data, dataset, enc_id, ref_data, file_path), enc_id, ac_ids_selected)
+                            for enc_id in enc_ids_selected]
+    prefetch_neighbour_encounters(memory_data, dataset, enc_ids_selected, ref_data, file_path)
+
+    return concatenate_enc_columns(enc_columns_list)
 
 
 def parse_enc_data(memory_data, enc_ids_selected, ac_ids_selected, ref_data, file_path):
-    if memory_data['type'] == 'created' or memory_data['type'] == 'json':
-        return parse_enc_data_from_encounters_data(enc_ids_selected, memory_data['encounter_indices'], memory_data['encounters_data'], memory_data['ac_ids'], ac_ids_selected, ref_data)
-    else:
-        return parse_enc_data_from_filename(enc_ids_selected, memory_data['encounter_indices'], file_path+memory_data['filename'], memory_data['ac_ids'], ac_ids_selected, ref_data)
\ No newline at end of file
+    return enc_columns_to_records(parse_enc_columns(memory_data, enc_ids_selected, ac_ids_selected, ref_data, file_path))
@@ -0,0 +1,66 @@
+import numpy as np
+import pymap3d as pm
+
+from helpers.constants import *
+from helpers.cache_helpers import *
+
+WGS84 = pm.Ellipsoid('wgs84')
+
+reference_frame_cache = LRUByteCache(PROJECTION_CACHE_BYTE_SIZE)
+
+
+class ReferenceFrame:
+    '''
+        Local east/north/up frame around a reference point (ref_lat and ref_long in
+        degrees, ref_alt in ft) on the WGS84 ellipsoid. The ECEF origin of the frame
+        and its rotation from ECEF are computed once, whole arrays of points are then
+        converted with a matrix product plus one vectorized ECEF/geodetic conversion.
+        Positions use the units of the app: xEast and yNorth in NM, altitudes in ft.
+    '''
+    def __init__(self, ref_lat, ref_long, ref_alt):
+        self.origin = np.array(pm.geodetic2ecef(ref_lat, ref_long, ref_alt*FT_TO_M, ell=WGS84, deg=True))
+
+        lat, long = np.radians(ref_lat), np.radians(ref_long)
+        self.rotation = np.array([[-np.sin(long), np.cos(long), 0.],
+                                  [-np.sin(lat)*np.cos(long), -np.sin(lat)*np.sin(long), np.cos(lat)],
+                                  [np.cos(lat)*np.cos(long), np.cos(lat)*np.sin(long), np.sin(lat)]])
+
+    def enu_to_geodetic(self, xEast, yNorth, zUp):
+        enu = np.stack(np.broadcast_arrays(np.asarray(xEast, dtype=float)*NM_TO_M,
+                                           np.asarray(yNorth, dtype=float)*NM_TO_M,
+                                           np.asarray(zUp, dtype=float)*FT_TO_M), axis=-1)
+        x, y, z = np.moveaxis(enu @ self.rotation + self.origin, -1, 0)
+
+        lat, long, alt = pm.ecef2geodetic(x, y, z, ell=WGS84, deg=True)
+        return lat, long, alt*M_TO_FT
+
+    def geodetic_to_enu(self, lat, long, alt):
+        ecef = np.stack(pm.geodetic2ecef(*np.broadcast_arrays(np.asarray(lat, dtype=float),
+                                                               np.asarray(long, dtype=float),
+                                                               np.asarray(alt, dtype=float)*FT_TO_M),
+                                         ell=WGS84, deg=True), axis=-1)
+        xEast, yNorth, zUp = np.moveaxis((ecef - self.origin) @ self.rotation.T, -1, 0)
+
+        return xEast*M_TO_NM, yNorth*M_TO_NM, zUp*M_TO_FT
+
+
+'''
+    Returns the ReferenceFrame of the reference point in ref_data (the contents of
+    the ref-data store), built once per reference point.
+'''
+def get_reference_frame(ref_data):
+    key = (float(ref_data['ref_lat']), float(ref_data['ref_long']), float(ref_data['ref_alt']))
+
+    frame = reference_frame_cache.get(key)
+    if frame is None:
+        frame = ReferenceFrame(*key)
+        reference_frame_cache.put(key, frame, nbytes=frame.origin.nbytes + frame.rotation.nbytes)
+    return frame
+
+
+def enu_to_geodetic(xEast, yNorth, zUp, ref_data):
+    return get_reference_frame(ref_data).enu_to_geodetic(xEast, yNorth, zUp)
+
+
+def geodetic_to_enu(lat, long, alt, ref_data):
+    return get_reference_frame(ref_data).geodetic_to_enu(lat, long, alt)
@@ -0,0 +1,179 @@
+import numpy as np
+
+from helpers.constants import *
+from helpers.encounter_file_helpers import *
+from helpers.parse_encounter_helpers import *
+
+'''
+    Batched PCHIP resampling of many trajectories at once, for whole encounter sets.
+    Trajectories are packed one after the other into flat arrays: times (N,) and
+    values (N, D) hold the waypoints of every trajectory and offsets (K+1,) the
+    start of each of the K trajectories followed by N. The slopes and the
+    evaluation follow scipy.interpolate.PchipInterpolator (including its
+    extrapolation past the last waypoint), but are computed for every trajectory
+    with the same handful of array operations instead of one interpolator per
+    trajectory and column.
+'''
+
+
+'''
+    Endpoint slope of a trajectory from its first (or last, mirrored) two intervals,
+    the non-centered, shape preserving three point formula PchipInterpolator uses.
+'''
+def _pchip_edge_slopes(h0, h1, m0, m1):
+    slopes = ((2*h0 + h1)*m0 - h0*m1) / (h0 + h1)
+
+    sign_changed = np.sign(slopes) != np.sign(m0)
+    overshoot = (np.sign(m0) != np.sign(m1)) & (np.abs(slopes) > 3*np.abs(m0))
+    slopes = np.where(overshoot, 3*m0, slopes)
+    return np.where(sign_changed, 0., slopes)
+
+
+'''
+    PCHIP slopes (N, D) at every waypoint of the packed trajectories. Interior
+    waypoints get the weighted harmonic mean of the secants on either side (0 where
+    the trajectory has a local extremum), the ends the three point formula, and a
+    trajectory of two waypoints the slope of its only secant. Trajectories of a
+    single waypoint are constant.
+'''
+def pchip_slopes(times, values, offsets):
+    times, values, offsets = np.asarray(times, dtype=float), np.asarray(values, dtype=float), np.asarray(offsets, dtype=np.int64)
+    starts, ends = offsets[:-1], offsets[1:]
+    lengths = ends - starts
+
+    h = np.diff(times)
+    within = np.ones(len(h), dtype=bool)
+    within[ends[(ends > 0) & (ends < len(times))] - 1] = False
+    if np.any(h[within] <= 0):
+        raise ValueError('waypoint times of a trajectory must be strictly increasing')
+
+    h = np.where(within, h, 1.)
+    secants = np.diff(values, axis=0) / h[:, None]
+
+    slopes = np.zeros_like(values)
+
+    # interior waypoints k, between secants k-1 and k
+    interior = np.zeros(len(times), dtype=bool)
+    interior[1:-1] = within[:-1] & within[1:]
+    k = np.flatnonzero(interior)
+    if len(k):
+        h0, h1 = h[k-1, None], h[k, None]
+        m0, m1 = secants[k-1], secants[k]
+        w0, w1 = 2*h1 + h0, h1 + 2*h0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            harmonic_mean = 1. / ((w0/m0 + w1/m1) / (w0 + w1))
+        extremum = (np.sign(m0) != np.sign(m1)) | (m0 == 0) | (m1 == 0)
+        slopes[k] = np.where(extremum, 0., harmonic_mean)
+
+    # trajectories of two waypoints are linear
+    linear = starts[lengths == 2]
+    slopes[linear] = secants[linear]
+    slopes[linear+1] = secants[linear]
+
+    # ends of trajectories of three waypoints or more
+    first, last = starts[lengths > 2], ends[lengths > 2] - 1
+    slopes[first] = _pchip_edge_slopes(h[first, None], h[first+1, None], secants[first], secants[first+1])
+    slopes[last] = _pchip_edge_slopes(h[last-1, None], h[last-2, None], secants[last-1], secants[last-2])
+
+    return slopes
+
+
+'''
+    Resamples the packed trajectories at the multiples of time_step from the first to
+    the last waypoint of each trajectory (truncated to whole steps, like
+    waypoint_helpers.interpolate_df_time does for 1 s). Returns the packed grid:
+    grid_offsets (K+1,), grid_times (M,) and grid_values (M, D).
+'''
+def resample_pchip(times, values, offsets, time_step=RESAMPLE_TIME_STEP):
+    times, values, offsets = np.asarray(times, dtype=float), np.asarray(values, dtype=float), np.asarray(offsets, dtype=np.int64)
+    num_trajectories = len(offsets) - 1
+    starts, ends = offsets[:-1], offsets[1:]
+    if np.any(ends <= starts):
+        raise ValueError('every trajectory needs at least one waypoint')
+
+    slopes = pchip_slopes(times, values, offsets)
+
+    first_steps = np.trunc(times[starts] / time_step).astype(np.int64)
+    num_steps = np.trunc(times[ends-1] / time_step).astype(np.int64) - first_steps + 1
+    grid_offsets = np.concatenate(([0], np.cumsum(num_steps)))
+
+    grid_trajectories = np.repeat(np.arange(num_trajectories), num_steps)
+    grid_times = (np.repeat(first_steps, num_steps) + np.arange(grid_offsets[-1]) - np.repeat(grid_offsets[:-1], num_steps)) * time_step
+
+    # interval of every grid time: the last waypoint of its trajectory at or before
+    # it, found for all trajectories in one sort of waypoints and grid times together
+    trajectories = np.repeat(np.arange(num_trajectories), ends - starts)
+    is_grid = np.concatenate((np.zeros(len(times), dtype=bool), np.ones(len(grid_times), dtype=bool)))
+    order = np.lexsort((is_grid, np.concatenate((times, grid_times)), np.concatenate((trajectories, grid_trajectories))))
+    waypoints_before = np.cumsum(~is_grid[order])
+    intervals = np.empty(len(grid_times), dtype=np.int64)
+    intervals[order[is_grid[order]] - len(times)] = waypoints_before[is_grid[order]] - 1
+    # extrapolate with the first and last interval
+    intervals = np.clip(intervals, starts[grid_trajectories], np.maximum(ends[grid_trajectories]-2, starts[grid_trajectories]))
+
+    single = (ends - starts == 1)[grid_trajectories]
+    next_intervals = np.where(single, intervals, intervals+1)
+    h = np.where(single, 1., times[next_intervals] - times[intervals])[:, None]
+    s = (grid_times - times[intervals])[:, None]
+
+    y0, y1 = values[intervals], values[next_intervals]
+    d0, d1 = slopes[intervals], slopes[next_intervals]
+    secants = (y1 - y0) / h
+    t = (d0 + d1 - 2*secants) / h
+    grid_values = ((t/h*s + (secants - d0)/h - t)*s + d0)*s + y0
+
+    return grid_offsets, grid_times, grid_values
+
+
+'''
+    Packs the waypoints of a run of encounters as trajectories, one per aircraft of
+    every encounter (encounter major). Runs sharing the layout of their first
+    encounter are read as a structured array straight from the mapping.
+'''
+def encounter_trajectories(enc_file, enc_indices, enc_ids, num_ac):
+    enc_starts = np.asarray(enc_indices[enc_ids.start:enc_ids.stop+1], dtype=np.int64)
+    num_updates = encounter_num_updates(enc_file.encounter(enc_ids.start, enc_indices), num_ac)
+    enc_dtype = encounter_dtype(num_updates)
+
+    chunk = None
+    if np.all(np.diff(enc_starts) == enc_dtype.itemsize) and int(enc_starts[0]) + len(enc_ids)*enc_dtype.itemsize <= enc_file.size:
+        chunk = np.frombuffer(enc_file.buffer, dtype=enc_dtype, count=len(enc_ids), offset=int(enc_starts[0]))
+        if not all(np.all(chunk[f'num_updates_{ac}'] == ac_num_updates) for ac, ac_num_updates in enumerate(num_updates)):
+            chunk = None
+
+    if chunk is not None:
+        columns = {}
+        for key in ['time', 'xEast', 'yNorth', 'zUp']:
+            initial = [np.zeros((len(chunk), 1)) if key == 'time' else chunk['initial'][key][:, ac, None] for ac in range(num_ac)]
+            columns[key] = np.concatenate([np.concatenate((initial[ac], chunk[f'updates_{ac}'][key]), axis=1) for ac in range(num_ac)], axis=1).ravel()
+        lengths = np.tile(np.asarray(num_updates) + 1, len(chunk))
+        columns['xEast'], columns['yNorth'] = columns['xEast'] * FT_TO_NM, columns['yNorth'] * FT_TO_NM
+    else:
+        enc_columns = [decode_encounter(enc_file.encounter(enc_id, enc_indices), list(range(num_ac))) for enc_id in enc_ids]
+        columns = {key: np.concatenate([columns[key] for columns in enc_columns]) for key in ['time', 'xEast', 'yNorth', 'zUp']}
+        lengths = np.concatenate([np.bincount(columns['ac_id'], minlength=num_ac) for columns in enc_columns])
+
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    return offsets, columns['time'], np.column_stack((columns['xEast'], columns['yNorth'], columns['zUp']))
+
+
+'''
+    Yields the encounters enc_ids (a range) of filename resampled every time_step
+    seconds, chunk_size encounters at a time, as flat columns: encounter_id, ac
+    (aircraft position), time, xEast, yNorth (NM) and zUp (ft).
+'''
+def iter_resampled_encounter_chunks(filename, enc_indices, enc_ids, num_ac, time_step=RESAMPLE_TIME_STEP, chunk_size=RESAMPLE_CHUNK_SIZE):
+    enc_file = get_encounter_file(filename)
+
+    for start in range(enc_ids.start, enc_ids.stop, chunk_size):
+        chunk_enc_ids = range(start, min(start+chunk_size, enc_ids.stop))
+        offsets, times, values = encounter_trajectories(enc_file, enc_indices, chunk_enc_ids, num_ac)
+        grid_offsets, grid_times, grid_values = resample_pchip(times, values, offsets, time_step)
+
+        num_steps = np.diff(grid_offsets)
+        yield {'encounter_id': np.repeat(np.repeat(np.asarray(chunk_enc_ids), num_ac), num_steps),
+               'ac': np.repeat(np.tile(np.arange(num_ac), len(chunk_enc_ids)), num_steps),
+               'time': grid_times,
+               'xEast': grid_values[:, 0],
+               'yNorth': grid_values[:, 1],
+               'zUp': grid_values[:, 2]}
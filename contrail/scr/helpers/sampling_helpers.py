@@ -0,0 +1,82 @@
+import hashlib
+import numpy as np
+
+from helpers.cache_helpers import *
+from helpers.constants import *
+
+covariance_factor_cache = LRUByteCache(KERNEL_CACHE_BYTE_SIZE)
+
+'''
+    Returns a lower triangular factor L with L @ L.T ~= cov. Tries a plain Cholesky
+    decomposition first, then Cholesky of cov with an increasing diagonal jitter for
+    kernels that are only positive semi-definite up to round off, and finally falls
+    back to an eigen decomposition with the negative eigenvalues clipped to 0 (the
+    factor is then no longer triangular, which does not matter for sampling).
+    Factors are cached on the contents of cov.
+'''
+def covariance_factor(cov):
+    cov = np.asarray(cov, dtype=float)
+    cache_key = (hashlib.sha1(cov.tobytes()).hexdigest(), cov.shape)
+    factor = covariance_factor_cache.get(cache_key)
+    if factor is not None:
+        return factor
+
+    factor = None
+    try:
+        factor = np.linalg.cholesky(cov)
+    except np.linalg.LinAlgError:
+        diag_scale = np.mean(np.diag(cov)) if cov.size else 1.
+        for jitter in COVARIANCE_JITTERS:
+            try:
+                factor = np.linalg.cholesky(cov + jitter * diag_scale * np.eye(cov.shape[0]))
+                break
+            except np.linalg.LinAlgError:
+                continue
+
+    if factor is None:
+        eig_values, eig_vectors = np.linalg.eigh(cov)
+        factor = eig_vectors * np.sqrt(np.clip(eig_values, 0, None))
+
+    factor.setflags(write=False)
+    covariance_factor_cache.put(cache_key, factor)
+    return factor
+
+
+class GaussianSampler:
+    '''
+        Samples a multivariate normal distribution given either its full covariance
+        or, for diagonal covariances, the variance of every dimension. The covariance
+        is factored once and samples are drawn as mean + Z @ L.T (or mean + Z * std)
+        with Z from a numpy.random.Generator, batch_size samples at a time.
+    '''
+    def __init__(self, mean, cov=None, variances=None):
+        self.mean = np.asarray(mean, dtype=float).ravel()
+
+        if variances is not None:
+            self.std = np.sqrt(np.broadcast_to(np.asarray(variances, dtype=float), self.mean.shape))
+            self.factor = None
+        else:
+            self.std = None
+            self.factor = covariance_factor(cov)
+
+    @property
+    def marginal_std(self):
+        if self.factor is None:
+            return self.std
+        return np.sqrt(np.sum(np.square(self.factor), axis=1))
+
+    def iter_samples(self, num_samples, rng, batch_size=SAMPLE_BATCH_SIZE):
+        for start in range(0, num_samples, batch_size):
+            z = rng.standard_normal((min(batch_size, num_samples-start), self.mean.shape[0]))
+            if self.factor is None:
+                yield self.mean + z * self.std
+            else:
+                yield self.mean + z @ self.factor.T
+
+    def sample(self, num_samples, rng, batch_size=SAMPLE_BATCH_SIZE):
+        samples = np.empty((num_samples, self.mean.shape[0]))
+        start = 0
+        for batch in self.iter_samples(num_samples, rng, batch_size):
+            samples[start:start+len(batch)] = batch
+            start += len(batch)
+        return samples
@@ -0,0 +1,204 @@
+import os
+import json
+import time
+import uuid
+import threading
+
+from flask import request, jsonify
+from werkzeug.utils import secure_filename
+
+from helpers.constants import *
+from helpers.encounter_index_helpers import *
+
+'''
+    Chunked, resumable upload of waypoint .dat files straight into the data directory,
+    served by the Flask server behind the app (see assets/chunked-upload.js for the
+    browser side):
+
+        POST /upload                    {filename, size} -> {upload_id, offset, chunk_size}
+        GET  /upload/<upload_id>        -> {upload_id, offset, size, chunk_size}
+        PUT  /upload/<upload_id>?offset body: the bytes of the file from offset on
+        POST /upload/<upload_id>/complete -> {filename}
+
+    Chunks are appended to UPLOAD_DIRECTORY/<upload_id>.part and must arrive in order,
+    a chunk for any other offset than the number of bytes received so far is answered
+    with 409 and that number so the client can resume from there. The encounter
+    offsets are built from the chunks as they arrive, so completing an upload only
+    renames the file into the data directory and writes its sidecar index.
+'''
+UPLOAD_INFO_EXTENSION = '.json'
+UPLOAD_PART_EXTENSION = '.part'
+
+# upload id -> {'indexer': EncounterIndexer, 'received': bytes fed to it}
+_upload_indexers = {}
+_upload_lock = threading.Lock()
+
+
+def upload_filepaths(upload_id):
+    upload_filepath = os.path.join(UPLOAD_DIRECTORY, upload_id)
+    return upload_filepath + UPLOAD_INFO_EXTENSION, upload_filepath + UPLOAD_PART_EXTENSION
+
+
+def read_upload_info(upload_id):
+    if not upload_id.isalnum():
+        return None
+
+    info_filepath, _ = upload_filepaths(upload_id)
+    try:
+        with open(info_filepath) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def remove_upload(upload_id):
+    _upload_indexers.pop(upload_id, None)
+    for filepath in upload_filepaths(upload_id):
+        if os.path.exists(filepath):
+            os.remove(filepath)
+
+
+'''
+    Drops the uploads that have not received a chunk for UPLOAD_MAX_IDLE seconds.
+'''
+def remove_idle_uploads():
+    now = time.time()
+    for filename in os.listdir(UPLOAD_DIRECTORY):
+        upload_id, extension = os.path.splitext(filename)
+        if extension == UPLOAD_PART_EXTENSION and now - os.path.getmtime(os.path.join(UPLOAD_DIRECTORY, filename)) > UPLOAD_MAX_IDLE:
+            print('Removing idle upload', upload_id)
+            remove_upload(upload_id)
+
+
+'''
+    Returns the EncounterIndexer of upload_id, fed with the first received bytes of
+    the upload. The indexer is rebuilt from the part file when the chunks so far
+    have been received by another server process, or before a restart.
+'''
+def upload_indexer(upload_id, part_filepath, received):
+    session = _upload_indexers.get(upload_id)
+    if session is not None and session['received'] == received:
+        return session['indexer']
+
+    indexer = EncounterIndexer()
+    with open(part_filepath, 'rb') as file:
+        while not indexer.done and indexer.resume_position < received:
+            position = indexer.resume_position
+            file.seek(position)
+            indexer.feed(file.read(min(INDEX_CHUNK_BYTE_SIZE, received-position)), position)
+
+    _upload_indexers[upload_id] = {'indexer': indexer, 'received': received}
+    return indexer
+
+
+'''
+    Checks the num_enc/num_ac header of an upload against its size before the indexer
+    allocates its offsets, so that a file that is not a waypoints .dat file is turned
+    down right away.
+'''
+def valid_dat_header(data, size):
+    num_enc = int.from_bytes(data[0:INFO_BYTE_SIZE], byteorder='little')
+    num_ac = int.from_bytes(data[INFO_BYTE_SIZE:2*INFO_BYTE_SIZE], byteorder='little')
+    min_enc_byte_size = num_ac * (INITIAL_DIM * WAYPOINT_BYTE_SIZE + NUM_UPDATE_BYTE_SIZE)
+
+    return num_ac > 0 and 2 * INFO_BYTE_SIZE + num_enc * min_enc_byte_size <= size
+
+
+def start_upload():
+    params = request.get_json(silent=True) or {}
+    filename = secure_filename(os.path.basename(str(params.get('filename', ''))))
+    size = params.get('size')
+
+    if not filename.endswith('.dat'):
+        return jsonify({'error': 'Only waypoint .dat files can be uploaded.'}), 400
+    if not isinstance(size, int) or size < 2 * INFO_BYTE_SIZE:
+        return jsonify({'error': 'Invalid file size.'}), 400
+
+    os.makedirs(UPLOAD_DIRECTORY, exist_ok=True)
+    remove_idle_uploads()
+
+    upload_id = uuid.uuid4().hex
+    info_filepath, part_filepath = upload_filepaths(upload_id)
+    open(part_filepath, 'wb').close()
+    with open(info_filepath, 'w') as file:
+        json.dump({'filename': filename, 'size': size}, file)
+
+    return jsonify({'upload_id': upload_id, 'offset': 0, 'chunk_size': UPLOAD_CHUNK_BYTE_SIZE})
+
+
+def upload_status(upload_id):
+    info = read_upload_info(upload_id)
+    if info is None:
+        return jsonify({'error': 'Unknown upload.'}), 404
+
+    _, part_filepath = upload_filepaths(upload_id)
+    return jsonify({'upload_id': upload_id, 'offset': os.path.getsize(part_filepath),
+                    'size': info['size'], 'chunk_size': UPLOAD_CHUNK_BYTE_SIZE})
+
+
+def put_upload_chunk(upload_id):
+    offset = request.args.get('offset', type=int)
+    data = request.get_data()
+
+    with _upload_lock:
+        info = read_upload_info(upload_id)
+        if info is None:
+            return jsonify({'error': 'Unknown upload.'}), 404
+
+        _, part_filepath = upload_filepaths(upload_id)
+        received = os.path.getsize(part_filepath)
+        if offset != received:
+            return jsonify({'offset': received}), 409
+        if received + len(data) > info['size']:
+            return jsonify({'error': 'More bytes than the size of the file.'}), 400
+        if received < 2 * INFO_BYTE_SIZE <= received + len(data):
+            with open(part_filepath, 'rb') as file:
+                header = file.read(received) + data[:2*INFO_BYTE_SIZE-received]
+            if not valid_dat_header(header, info['size']):
+                remove_upload(upload_id)
+                return jsonify({'error': f'{info["filename"]} is not a waypoints .dat file.'}), 400
+
+        indexer = upload_indexer(upload_id, part_filepath, received)
+        with open(part_filepath, 'ab') as file:
+            file.write(data)
+        indexer.feed(data, offset)
+        _upload_indexers[upload_id]['received'] = received + len(data)
+
+    return jsonify({'offset': received + len(data)})
+
+
+'''
+    Moves a fully received upload into the data directory (replacing a file of the
+    same name, readers that still map the old one keep reading it) and writes its
+    sidecar index from the offsets built while the chunks arrived.
+'''
+def complete_upload(upload_id):
+    with _upload_lock:
+        info = read_upload_info(upload_id)
+        if info is None:
+            return jsonify({'error': 'Unknown upload.'}), 404
+
+        _, part_filepath = upload_filepaths(upload_id)
+        received = os.path.getsize(part_filepath)
+        if received != info['size']:
+            return jsonify({'error': f'Only {received} of {info["size"]} bytes received.'}), 400
+
+        indexer = upload_indexer(upload_id, part_filepath, received)
+        if not indexer.done or indexer.cursor != received:
+            remove_upload(upload_id)
+            return jsonify({'error': f'{info["filename"]} is truncated or not a waypoints .dat file.'}), 400
+
+        filepath = DEFAULT_DATA_FILE_PATH + info['filename']
+        os.replace(part_filepath, filepath)
+        write_encounter_index(filepath, indexer.offsets, indexer.num_ac, indexer.num_enc)
+        remove_upload(upload_id)
+
+    print('Uploaded', filepath)
+    return jsonify({'filename': info['filename']})
+
+
+def register_upload_routes(server):
+    server.add_url_rule('/upload', 'start_upload', start_upload, methods=['POST'])
+    server.add_url_rule('/upload/<upload_id>', 'upload_status', upload_status, methods=['GET'])
+    server.add_url_rule('/upload/<upload_id>', 'put_upload_chunk', put_upload_chunk, methods=['PUT'])
+    server.add_url_rule('/upload/<upload_id>/complete', 'complete_upload', complete_upload, methods=['POST'])
@@ -7,13 +7,13 @@ import numpy as np
 
 from scipy.interpolate import PchipInterpolator
 
-import pymap3d as pm
-
 from helpers.constants import *
+from helpers.projection_helpers import *
+from helpers.kinematics_helpers import *
 
 
 def interpolate_df_time(df, ac_ids_selected):
-    df_interp = pd.DataFrame()
+    df_ac_interps = []
     min_values_list, max_values_list = [], []
 
     for ac_id in ac_ids_selected:
@@ -32,7 +32,7 @@ def interpolate_df_time(df, ac_ids_selected):
         if 'vertical_speed' in df_ac.columns:
             df_ac_interp['vertical_speed'] = PchipInterpolator(df_ac['time'], df_ac['vertical_speed'])(df_ac_interp['time'])
 
-        df_interp = df_interp.append(df_ac_interp, ignore_index=True)   
+        df_ac_interps.append(df_ac_interp)
 
         if 'horizontal_speed' in df_ac.columns:
             min_values_list.append([min(df_ac_interp['time']), min(df_ac_interp['xEast']), min(df_ac_interp['yNorth']), min(df_ac_interp['zUp']), \
@@ -42,10 +42,24 @@ def interpolate_df_time(df, ac_ids_selected):
         else:
             min_values_list.append([min(df_ac_interp['time']), min(df_ac_interp['xEast']), min(df_ac_interp['yNorth']), min(df_ac_interp['zUp'])])
             max_values_list.append([max(df_ac_interp['time']), max(df_ac_interp['xEast']), max(df_ac_interp['yNorth']), max(df_ac_interp['zUp'])])
-            
+
+    df_interp = pd.concat(df_ac_interps, ignore_index=True) if df_ac_interps else pd.DataFrame()
     return df_interp, min_values_list, max_values_list
 
 
+'''
+    Lays the values of a trajectory sampled at the integer times out on the slider's
+    time steps t_min, t_min+1, ..., t_min+num_steps-1, with None at the steps the
+    trajectory does not cover. One list per marker trace of the slider-frames store.
+'''
+def slider_steps(times, values, t_min, num_steps):
+    steps = [None] * num_steps
+    for time, value in zip(np.asarray(times, dtype=int) - int(t_min), np.asarray(values, dtype=float).tolist()):
+        if 0 <= time < num_steps:
+            steps[time] = value
+    return steps
+
+
 # def calculate_horizontal_vertical_speeds_df(df): 
 #     dataf = df.copy()
 #     hor_speeds = []
@@ -61,52 +75,85 @@ def interpolate_df_time(df, ac_ids_selected):
 #     dataf.loc[:, 'vertical_speed'] = ver_speeds
 #     return dataf
 
+'''
+    Fills in the horizontal/vertical speed, heading and turn rate columns of the
+    waypoints table, computed per aircraft in time order for all aircraft at once
+    and rounded to 4 decimals.
+'''
 def calculate_turnrate_hor_ver_speeds_df(df):
     dataf = df.copy()
-    hor_speeds = []
-    ver_speeds = []
-    headings = []
-    turn_rates = []
-
-    for ac_id in set(df['ac_id']):
-        ac_id_data = df.loc[df['ac_id'] == ac_id]
-        move_over_time = (np.roll(ac_id_data, -1, axis=0) - ac_id_data)[:-1]
-
-        hor_speed = np.sqrt(move_over_time.xEast ** 2 + move_over_time.yNorth ** 2) / move_over_time['time'] * 3600
-        hor_speeds += (np.append(0.0, round(hor_speed, 4))).tolist()
-        ver_speed = move_over_time.zUp / move_over_time['time'] * 60
-        ver_speeds += (np.append(0.0, round(ver_speed, 4))).tolist()
-
-        angle = np.arctan2(move_over_time.lat, move_over_time.long) * 180 / np.pi 
-        heading = (90 - angle + 360) % 360
-        headings += (np.append(0.0, round(heading, 4))).tolist()
-
-        heading = (np.append([heading.iloc[0]], heading)).tolist()
-        turn_rate = (np.roll(heading, -1, axis=0) - heading)[:-1]
-        turn_rate = (turn_rate + 180) % 360 - 180
-        turn_rates += (np.append(0.0, np.around(turn_rate, 4))).tolist()
-        
-    dataf.loc[:, 'horizontal_speed'] = hor_speeds
-    dataf.loc[:, 'vertical_speed'] = ver_speeds
-    dataf.loc[:, 'heading'] = headings
-    dataf.loc[:, 'turn_rate'] = turn_rates
+    order = np.lexsort((np.asarray(df['time'], dtype=float), df['ac_id'].to_numpy()))
+    columns = {key: np.asarray(df[key], dtype=float)[order] for key in ['time', 'xEast', 'yNorth', 'zUp', 'lat', 'long']}
+
+    kinematics = trajectory_kinematics(trajectory_starts(df['ac_id'].to_numpy()[order]), columns['time'], columns['xEast'],
+                                       columns['yNorth'], columns['zUp'], lat=columns['lat'], long=columns['long'])
+    for key, values in kinematics.items():
+        column = np.empty(len(df))
+        column[order] = np.round(values, 4)
+        dataf.loc[:, key] = column
     return dataf
 
 
+'''
+    Updates, in place, the kinematics columns of the waypoints table records (data)
+    after the waypoints at the indices rows were moved or appended. A waypoint only
+    changes the steps to and from it, so only it and the two waypoints after it (in
+    time order, within its aircraft) are recomputed, from the two waypoints before
+    it on. The values match those of calculate_turnrate_hor_ver_speeds_df.
+'''
+def update_waypoint_kinematics(data, rows):
+    rows = set(rows)
+    for ac_id in {data[row]['ac_id'] for row in rows}:
+        ac_rows = sorted((i for i, data_point in enumerate(data) if data_point.get('ac_id') == ac_id), key=lambda i: data[i]['time'])
+        changed = [position for position, row in enumerate(ac_rows) if row in rows]
+
+        window = sorted({position for changed_position in changed
+                         for position in range(max(changed_position-2, 0), min(changed_position+3, len(ac_rows)))})
+        updated = {position for changed_position in changed for position in range(changed_position, changed_position+3)}
+
+        window_rows = [data[ac_rows[position]] for position in window]
+        columns = {key: np.array([data_point[key] for data_point in window_rows], dtype=float)
+                   for key in ['time', 'xEast', 'yNorth', 'zUp', 'lat', 'long']}
+        # the window is made of runs of consecutive waypoints, each run is a trajectory
+        starts = np.diff(window, prepend=-2) != 1
+
+        kinematics = trajectory_kinematics(starts, columns['time'], columns['xEast'], columns['yNorth'], columns['zUp'],
+                                           lat=columns['lat'], long=columns['long'])
+        for key, values in kinematics.items():
+            for position, data_point, value in zip(window, window_rows, np.round(values, 4).tolist()):
+                if position in updated:
+                    data_point[key] = value
+
+    return data
+
+
+'''
+    Fills in lat/long of the waypoints that have xEast and yNorth, and xEast/yNorth
+    of the waypoints that only have lat and long, projecting each group around the
+    reference point in one call. Waypoints are projected at their zUp altitude, or
+    at the reference altitude when they have none.
+'''
 def populate_lat_lng_xEast_yNorth(data, ref_data):
-    for data_point in data:
+    enu_points, geodetic_points = [], []
+    for i, data_point in enumerate(data):
         if data_point['xEast'] and data_point['yNorth']:
-            # calculate lat long
-            data_point['lat'], data_point['long'],_ = pm.enu2geodetic(data_point['xEast']*NM_TO_M, data_point['yNorth']*NM_TO_M,
-                                         data_point['yNorth']*FT_TO_M if data_point['yNorth'] else ref_data['ref_alt']*FT_TO_M, 
-                                         ref_data['ref_lat'], ref_data['ref_long'], ref_data['ref_alt']*FT_TO_M, 
-                                         ell=pm.Ellipsoid('wgs84'), deg=True)
-        
+            enu_points.append(i)
         elif data_point['lat'] and data_point['long']:
-            x, y,_ =  pm.geodetic2enu(data_point['lat'], data_point['long'],
-                                         data_point['yNorth']*FT_TO_M if data_point['yNorth'] else ref_data['ref_alt']*FT_TO_M, 
-                                         ref_data['ref_lat'], ref_data['ref_long'], ref_data['ref_alt']*FT_TO_M, 
-                                         ell=pm.Ellipsoid('wgs84'), deg=True)
-            data_point['xEast'], data_point['yNorth'] = x*M_TO_NM, y*M_TO_NM
+            geodetic_points.append(i)
+
+    alts = [data_point.get('zUp') or ref_data['ref_alt'] for data_point in data]
+
+    if enu_points:
+        lats, longs, _ = enu_to_geodetic([data[i]['xEast'] for i in enu_points], [data[i]['yNorth'] for i in enu_points],
+                                         [alts[i] for i in enu_points], ref_data)
+        for i, lat, long in zip(enu_points, lats.tolist(), longs.tolist()):
+            data[i]['lat'], data[i]['long'] = lat, long
+
+    if geodetic_points:
+        xEasts, yNorths, _ = geodetic_to_enu([data[i]['lat'] for i in geodetic_points], [data[i]['long'] for i in geodetic_points],
+                                             [alts[i] for i in geodetic_points], ref_data)
+        for i, xEast, yNorth in zip(geodetic_points, xEasts.tolist(), yNorths.tolist()):
+            data[i]['xEast'], data[i]['yNorth'] = xEast, yNorth
+
     return data
 
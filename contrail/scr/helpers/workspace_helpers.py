@@ -0,0 +1,113 @@
+import os
+import time
+import uuid
+
+from helpers.constants import *
+from helpers.encounter_file_helpers import *
+from helpers.encounter_index_helpers import *
+
+'''
+    Output files of the generation jobs. Every job writes to its own uniquely named
+    file in WORKSPACE_DIRECTORY, first as <file>.part and then renamed into place
+    once it is complete, so concurrent sessions (or server processes) never write to
+    the same file and a reader never sees a partial one.
+    Reading a workspace file through get_dataset touches its access time, and once
+    the workspace grows past WORKSPACE_QUOTA_BYTE_SIZE the least recently used
+    files are removed together with their sidecar indices.
+'''
+PARTIAL_FILE_EXTENSION = '.part'
+
+
+'''
+    Returns a new unique file name for a job output, relative to the data directory
+    like the file names kept in the memory-data and generated-data stores.
+'''
+def new_workspace_filename(prefix, extension='.dat'):
+    os.makedirs(WORKSPACE_DIRECTORY, exist_ok=True)
+    return f'{WORKSPACE_DIRNAME}{prefix}_{uuid.uuid4().hex}{extension}'
+
+
+def partial_filepath(filepath):
+    return filepath + PARTIAL_FILE_EXTENSION
+
+
+def is_workspace_file(filepath):
+    return os.path.dirname(os.path.abspath(filepath)) == os.path.abspath(WORKSPACE_DIRECTORY)
+
+
+'''
+    Renames the completed partial file of filepath into place and makes room for it
+    in the workspace.
+'''
+def commit_workspace_file(filepath):
+    os.replace(partial_filepath(filepath), filepath)
+    touch_workspace_file(filepath)
+    evict_workspace_files(keep=[filepath])
+
+
+'''
+    Marks filepath as just used. Only the access time is updated, the modification
+    time is part of what validates the file's sidecar index.
+'''
+def touch_workspace_file(filepath):
+    try:
+        os.utime(filepath, ns=(time.time_ns(), os.stat(filepath).st_mtime_ns))
+    except FileNotFoundError:
+        pass
+
+
+def remove_workspace_file(filepath):
+    close_encounter_file(filepath)
+    for path in [filepath, index_filepath(filepath)]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+'''
+    Removes the least recently used workspace files (and their sidecar indices) until
+    the workspace takes at most quota bytes, never removing the files in keep.
+    Partial files are left to the jobs writing them unless they have not been written
+    to for WORKSPACE_PARTIAL_MAX_AGE seconds, which means their job is gone.
+'''
+def evict_workspace_files(quota=WORKSPACE_QUOTA_BYTE_SIZE, keep=()):
+    keep = {os.path.abspath(filepath) for filepath in keep}
+    now = time.time()
+
+    entries = []
+    with os.scandir(WORKSPACE_DIRECTORY) as workspace_entries:
+        for entry in workspace_entries:
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+
+            if PARTIAL_FILE_EXTENSION in entry.name:
+                if now - stat.st_mtime > WORKSPACE_PARTIAL_MAX_AGE:
+                    print('Removing abandoned partial file', entry.path)
+                    remove_workspace_file(entry.path)
+                continue
+            entries.append((stat.st_atime, stat.st_size, entry.path))
+
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, filepath in sorted(entries):
+        if total_bytes <= quota:
+            break
+        if filepath.endswith(INDEX_FILE_EXTENSION):
+            # indices go with their .dat file, unless it is already gone. The index of a
+            # file evicted in this pass is already counted (and removed) with it
+            if not os.path.exists(filepath[:-len(INDEX_FILE_EXTENSION)]):
+                try:
+                    os.remove(filepath)
+                except FileNotFoundError:
+                    continue
+                total_bytes -= size
+            continue
+        if os.path.abspath(filepath) in keep:
+            continue
+
+        print('Evicting workspace file', filepath)
+        index_size = os.path.getsize(index_filepath(filepath)) if os.path.exists(index_filepath(filepath)) else 0
+        remove_workspace_file(filepath)
+        total_bytes -= size + index_size
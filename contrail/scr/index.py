@@ -33,6 +33,12 @@ import dash_bootstrap_components as dbc
 from app import app
 from headers import navbar
 from pages import home_page, settings_page, about_page
+from helpers.upload_helpers import register_upload_routes
+from helpers.export_helpers import register_export_routes
+
+### Server routes ###
+register_upload_routes(app.server)
+register_export_routes(app.server)
 
 ### Page container ###
 page_container = html.Div(children=[
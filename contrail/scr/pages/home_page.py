@@ -11,7 +11,7 @@ import dash
 from dash import dash_table
 from dash import dcc
 from dash import html
-from dash.dependencies import Input, Output, State, ALL
+from dash.dependencies import Input, Output, State, ALL, ClientsideFunction
 import dash_daq as daq
 
 import dash_bootstrap_components as dbc
@@ -20,14 +20,13 @@ import dash_leaflet as dl
 import plotly.express as px
 import plotly.graph_objs as go
 
-import multiprocessing as mp
 from itertools import repeat
 
 import numpy as np
 import pandas as pd
-import pymap3d as pm
 import plotly.express as px
 
+import os
 import collections
 import json
 import struct
@@ -37,7 +36,15 @@ import re
 from helpers.generate_helpers import *
 from helpers.parse_encounter_helpers import *
 from helpers.memory_data_helpers import *
+from helpers.encounter_file_helpers import *
+from helpers.dataset_registry_helpers import *
+from helpers.histogram_helpers import *
+from helpers.job_helpers import *
+from helpers.export_helpers import *
+from helpers.workspace_helpers import *
+from helpers.projection_helpers import *
 from helpers.waypoint_helpers import *
+from helpers.cpa_helpers import *
 from helpers.constants import *
 
 # Import Dash App Instance #
@@ -47,8 +54,6 @@ map_iconUrl = "https://dash-leaflet.herokuapp.com/assets/icon_plane.png"
 map_marker = dict(rotate=True, markerOptions=dict(icon=dict(iconUrl=map_iconUrl, iconAnchor=[16, 16])))
 map_patterns = [dict(repeat='15', dash=dict(pixelSize=0, pathOptions=dict(color='#000000', weight=5, opacity=0.9))), dict(offset='100%', repeat='0%', marker=map_marker)]
 
-#np.random.seed(3)
-
 tabs = html.Div(id='tab-div', children=[
         dbc.Tabs(id="tabs",
                 children=[
@@ -61,9 +66,13 @@ tabs = html.Div(id='tab-div', children=[
 load_generate_save_buttons_and_toggle = dbc.Container(
         dbc.Row(className='mt-3', children=[
             dbc.Col(className='ml-1', children=[
+                # the file is sent in chunks by assets/chunked-upload.js, which sets
+                # uploaded-filename once it is in the data directory
                 html.Label([
-                        dcc.Upload(id='load-waypoints', children = 
-                        dbc.Button('Load Waypoints (.dat)', id='load-waypoints-button', n_clicks=0, outline=False, color="light-blue"))
+                        dbc.Button('Load Waypoints (.dat)', id='load-waypoints-button', n_clicks=0, outline=False, color="light-blue"),
+                        html.Input(id='load-waypoints-input', type='file', accept='.dat', style={'display':'none'}),
+                        dcc.Input(id='uploaded-filename', type='text', value='', style={'display':'none'}),
+                        html.Div(id='upload-status', className='small')
                     ])],
                     width={"size": 'auto', "order": 1}),
 
@@ -74,7 +83,8 @@ load_generate_save_buttons_and_toggle = dbc.Container(
 
             dbc.Col(className="ml-25", children=[
                     dbc.Button('Save Waypoints (.dat) or Model (.json)', id='save-button', n_clicks=0, outline=False, color="primary"),
-                    dcc.Download(id='download-waypoints'),
+                    # generated sets are streamed from /export/<export_id>, the hidden iframe starts the download
+                    html.Iframe(id='download-waypoints', style={'display':'none'}),
                     dcc.Download(id='download-model')
             ],
             width={'size':'auto', 'order':3}),
@@ -94,6 +104,34 @@ load_generate_save_buttons_and_toggle = dbc.Container(
     fluid=True
     )
 
+# progress of the running background job (generation or encounter metrics)
+job_status_bar = dbc.Container(id='job-status-div', children=[
+        dbc.Row(className='mt-2', children=[
+            dbc.Col(className='ml-1', children=[
+                dbc.Progress(id='job-progress', value=0, striped=True, animated=True)
+            ],
+            width=4),
+            dbc.Col(className='ml-2', children=[
+                html.Div(id='job-status')
+            ],
+            width='auto'),
+            dbc.Col(className='ml-2', children=[
+                dbc.Button('CANCEL', id='cancel-job-button', n_clicks=0, size='sm', outline=True, color='secondary')
+            ],
+            width='auto')
+        ],
+        align='center',
+        no_gutters=True),
+
+        dcc.Store(id='generation-job', data={}),
+        dcc.Interval(id='generation-job-interval', interval=JOB_POLL_INTERVAL, disabled=True),
+        dcc.Store(id='metrics-job', data={}),
+        dcc.Interval(id='metrics-job-interval', interval=JOB_POLL_INTERVAL, disabled=True)
+    ],
+    fluid=True,
+    style={'display':'none'}
+    )
+
 encounter_ac_dropdowns = dbc.Container(
         dbc.Row([
             dbc.Col(dcc.Dropdown(id='encounter-ids', placeholder="Select ENC ID",  className='ml-1', multi=False), 
@@ -260,93 +298,84 @@ tab_2_graphs = html.Div(id='tab-2-graphs', children=[
     style={'display':'none'}
     )
 
-tab_4_graphs = html.Div(id='tab-4-graphs', children=[
-        dbc.Row(className='mt-4', children=[
-            dbc.Col(className='pr-2', children=[
+def histogram_card(title, figure):
+    return dbc.Col(className='pr-2', children=[
                 dbc.Card(className='card-histograms', children=[
                     dbc.CardBody([
                         dbc.Row([
-                            dbc.Col(html.H5("AC 1: xEast vs. yNorth", className="card-title-1"))
+                            dbc.Col(html.H5(title, className="card-title-1"))
                         ],justify='center'),
 
                         dbc.Row([
-                            dbc.Col(
-                                dcc.Loading(parent_className='loading-hist-ac-1-xy', 
-                                children=[dcc.Graph(id='log-histogram-ac-1-xy', figure=go.Figure())],
-                                type='circle',
-                                color='white'
-                                ) 
-                            )
+                            dbc.Col(dcc.Graph(figure=figure))
                         ],justify='center')
                     ])
                 ]),
             ],
-            width='auto'),
-
-            dbc.Col(className='pr-2', children=[
-                dbc.Card(className='card-histograms', children=[
-                    dbc.CardBody([
-                        dbc.Row([
-                            dbc.Col(html.H5("AC 1: Time vs. zUp", className="card-title-1"))
-                        ],justify='center'),
+            width='auto')
 
-                        dbc.Row([
-                            dbc.Col(
-                                dcc.Loading(parent_className='loading-hist-ac-1-tz', 
-                                children=[dcc.Graph(id='log-histogram-ac-1-tz', figure=go.Figure())],
-                                type='circle',
-                                color='white'
-                                ) 
-                            )
-                        ],justify='center')
-                    ])
-                ]),
-            ], 
-            width='auto'),
-            dbc.Col(className='pr-2', children=[
-                dbc.Card(className='card-histograms', children=[
-                    dbc.CardBody([
-                        dbc.Row([
-                            dbc.Col(html.H5("AC 2: xEast vs. yNorth", className="card-title-1"))
-                        ],justify='center'),
+# closest point of approach of every encounter of the loaded or generated set,
+# computed by a background job then paged, sorted and filtered on the server
+encounter_metrics_card = dbc.Card(className='card-metrics', children=[
+        dbc.CardBody([
+            dbc.Row([
+                dbc.Col(html.H5('Encounter Metrics', className="card-title-1"), width='auto'),
+                dbc.Col(className='ml-3', children=[
+                    dbc.Button('COMPUTE CPA METRICS', id='compute-metrics-button', n_clicks=0, size='sm', outline=True, color='secondary')
+                ],
+                width='auto'),
+                dbc.Col(className='ml-3', children=[
+                    html.Div(id='metrics-summary')
+                ],
+                width='auto')
+            ],
+            align='center',
+            no_gutters=True),
+
+            dbc.Row(className='mt-2', children=[
+                dbc.Col(dash_table.DataTable(
+                    id='metrics-table',
+                    columns=[
+                        {"name": 'ENC ID', "id": 'encounter_id', 'type':'numeric'},
+                        {"name": 'AC 1', "id": 'ac_1', 'type':'numeric'},
+                        {"name": 'AC 2', "id": 'ac_2', 'type':'numeric'},
+                        {"name": 'CPA Time (s)', "id": 'cpa_time', 'type':'numeric', 'format': {'specifier': '.2~f'}},
+                        {"name": 'Horizontal Miss Distance (NM)', "id": 'hmd', 'type':'numeric', 'format': {'specifier': '.4~f'}},
+                        {"name": 'Vertical Miss Distance (ft)', "id": 'vmd', 'type':'numeric', 'format': {'specifier': '.2~f'}},
+                        {"name": 'NMAC', "id": 'nmac', 'type':'numeric'}],
+                    data=[],
+                    page_current=0,
+                    page_size=CPA_METRICS_PAGE_SIZE,
+                    page_count=0,
+                    page_action='custom',
+                    sort_action='custom',
+                    sort_mode='multi',
+                    sort_by=[],
+                    filter_action='custom',
+                    filter_query='',
+                    style_cell={'fontSize':11, 'height':'auto', 'whiteSpace':'normal'}))
+            ]),
+
+            dcc.Store(id='metrics-data', data={})
+        ])
+    ],
+    style={'margin-left':'15px', 'margin-right':'15px'})
 
-                        dbc.Row([
-                            dbc.Col(
-                                dcc.Loading(parent_className='loading-hist-ac-2-xy', 
-                                children=[dcc.Graph(id='log-histogram-ac-2-xy', figure=go.Figure())],
-                                type='circle',
-                                color='white'
-                                ) 
-                            )
-                        ],justify='center')
-                    ])
-                ]),
+# one xEast vs. yNorth and one Time vs. zUp card per aircraft of the generated set
+tab_4_graphs = html.Div(id='tab-4-graphs', children=[
+        dcc.Loading(parent_className='loading-histograms', 
+            children=[
+                dbc.Row(id='histogram-container', className='mt-4', children=[],
+                        no_gutters=True,
+                        style={'margin-left':'15px'})
             ],
-            width='auto'),
+            type='circle',
+            color='white'
+        ),
 
-            dbc.Col(className='pr-2', children=[
-                dbc.Card(className='card-histograms', children=[
-                    dbc.CardBody([
-                        dbc.Row([
-                            dbc.Col(html.H5("AC 2: Time vs. zUp", className="card-title-1"))
-                        ],justify='center'),
+        html.Br(),
 
-                        dbc.Row([
-                            dbc.Col(
-                                dcc.Loading(parent_className='loading-hist-ac-2-tz', 
-                                children=[dcc.Graph(id='log-histogram-ac-2-tz', figure=go.Figure())],
-                                type='circle',
-                                color='white'
-                                )    
-                            )
-                        ],justify='center')
-                    ])
-                ]),
-            ],
-            width='auto')
-        ],
-        no_gutters=True,
-        style={'margin-left':'15px'}),
+        encounter_metrics_card,
 
         html.Br(),
 
@@ -360,7 +389,8 @@ slider_bar = html.Div(id='slider-bar-div', children=[
                 dbc.CardBody(className='card-body-m-0 p-2', children=[
                     dbc.Row([
                         dbc.Col(className='mt-0', children=[ #mt-05
-                            html.Div(id='slider-drag-output', children='Time: ', style={'font-size': 15})
+                            html.Div(id='slider-drag-output', children='Time: ', style={'font-size': 15}),
+                            dcc.Store(id='slider-frames', data={})
                         ], width=2),
                         dbc.Col(className='mt-2 p-0', children=[ #mt-3 ml-4
                             html.Div([
@@ -671,7 +701,15 @@ generation_modal = html.Div(id='gen-modal-div', children=[
                 debounce=True,
                 pattern=u"^(\d+)$",
                 style={'margin-left':'20px', "width": "40%"}),
-            
+
+            # seed of the random streams, the same seed reproduces the same encounter set
+            html.Br(),
+            dcc.Markdown(("""Random Seed (optional):"""), style={'font-weight': 'bold',"margin-left": "20px"}),
+            dbc.Input(id='generation-seed-input', type='number', placeholder='random', min=0,
+                debounce=True,
+                pattern=u"^(\d+)$",
+                style={'margin-left':'20px', "width": "40%"}),
+
             # generation progress bar
             html.Br(),
             html.Br(),
@@ -755,6 +793,7 @@ save_modal = html.Div(id='save-modal-div', children=[
 layout = html.Div([
 
     load_generate_save_buttons_and_toggle,
+    job_status_bar,
     html.Br(),
 
     html.Div(id='home-div', 
@@ -823,16 +862,15 @@ layout = html.Div([
 # MEMORY DATA CALLBACKS #
 ###########################################################################################
 @app.callback(Output('memory-data', 'data'),
-                [Input('load-waypoints', 'filename'),
+                [Input('uploaded-filename', 'value'),
                Input('create-mode', 'n_clicks'),
                Input('end-new-button', 'n_clicks'),
                Input('generated-data', 'data'),
                Input('ref-data', 'data'),
                Input('load-model', 'contents')],
                State('editable-table', 'data'),
-               State('load-waypoints-button', 'n_clicks'),
-               State('load-waypoints', 'contents'))
-def update_memory_data(loaded_filename, create_n_clicks, end_new_n_clicks, generated_data, ref_data, model_contents, table_data, upload_n_clicks, waypoints_contents): 
+               State('load-waypoints-button', 'n_clicks'))
+def update_memory_data(uploaded_filename, create_n_clicks, end_new_n_clicks, generated_data, ref_data, model_contents, table_data, upload_n_clicks): 
     '''
     Updates memory-data.data to store data of interest. Triggered either by uploading a waypoints.dat file,
     entering create mode, creating a nominal path in create mode, changing the reference point,
@@ -849,20 +887,22 @@ def update_memory_data(loaded_filename, create_n_clicks, end_new_n_clicks, gener
     elif ctx == 'end-new-button' and end_new_n_clicks > 0: 
         encounters_data, encounter_byte_indices, num_ac, num_encounters = convert_created_data(table_data)
 
-        return {'encounters_data': str(encounters_data),
-                'encounter_indices': encounter_byte_indices,
+        return {**created_dataset_store(encounter_byte_indices, encounters_data),
                 'ac_ids': [ac for ac in range(1, num_ac+1)],
                 'num_encounters': num_encounters,
                 'type':'created'}
     
-    elif ctx == 'load-waypoints' and upload_n_clicks > 0:
-        if not loaded_filename:
+    elif ctx == 'uploaded-filename' and upload_n_clicks > 0:
+        if not uploaded_filename:
             return {}
 
+        # {filename, uploaded}, uploading a file of the same name again still changes the value
+        loaded_filename = json.loads(uploaded_filename)['filename']
+
         encounter_byte_indices, num_ac, num_encounters = parse_dat_file_and_set_indices(file_path+loaded_filename) 
 
-        return {'filename':loaded_filename,
-                'encounter_indices': encounter_byte_indices,
+        return {'handle': register_dataset(encounter_byte_indices),
+                'filename':loaded_filename,
                 'ac_ids': [ac for ac in range(1, num_ac+1)],
                 'num_encounters': num_encounters,
                 'type':'loaded'}
@@ -870,8 +910,8 @@ def update_memory_data(loaded_filename, create_n_clicks, end_new_n_clicks, gener
             
     elif ctx == 'generated-data':
         if generated_data != {} and ref_data != {}:
-            return {'filename': generated_data['filename'],
-                    'encounter_indices': generated_data['encounter_indices'],
+            return {'handle': generated_data['handle'],
+                    'filename': generated_data['filename'],
                     'ac_ids': generated_data['ac_ids'],
                     'num_encounters': generated_data['num_encounters'],
                     'type':'generated'}
@@ -880,8 +920,7 @@ def update_memory_data(loaded_filename, create_n_clicks, end_new_n_clicks, gener
         if model_contents is not None:
             encounters_data, encounter_byte_indices, num_ac, num_encounters = convert_json_file(model_contents)
     
-            return {'encounters_data': str(encounters_data),
-                    'encounter_indices': encounter_byte_indices,
+            return {**created_dataset_store(encounter_byte_indices, encounters_data),
                     'ac_ids': [ac for ac in range(1, num_ac+1)],
                     'num_encounters': num_encounters,
                     'type':'json'}
@@ -896,8 +935,7 @@ def update_memory_data(loaded_filename, create_n_clicks, end_new_n_clicks, gener
 ###########################################################################################
 # 2D and 3D GRAPHS CALLBACKS #
 ###########################################################################################
-@app.callback(Output('slider-drag-output', 'children'),
-              Output('slider', 'value'),
+@app.callback(Output('slider', 'value'),
               Output('editable-graph-xy-slider', 'figure'),
               Output('editable-graph-tz-slider', 'figure'),
               Output('editable-graph-tspeedxy-slider', 'figure'),
@@ -907,30 +945,44 @@ def update_memory_data(loaded_filename, create_n_clicks, end_new_n_clicks, gener
               Output('editable-graph-tdistz-slider', 'figure'),
               Output('slider', 'min'),
               Output('slider', 'max'),
-              Input('slider', 'value'),
+              Output('slider-frames', 'data'),
               Input('editable-table', 'data'),
               State('encounter-ids', 'value'),
               State('ac-ids', 'value'),
               State('add-rows-button', 'n_clicks'),
               State('done-add-rows-button', 'n_clicks'), 
              )
-def update_graphs_with_sliders(t_value, data, encounter_id_selected, ac_ids_selected, add_rows_n_clicks, done_add_rows_n_clicks):
+def update_graphs_with_sliders(data, encounter_id_selected, ac_ids_selected, add_rows_n_clicks, done_add_rows_n_clicks):
+    '''
+    Interpolates the trajectories and draws the slider graphs once per change of the
+    table, with the markers at the start of the encounter. The marker positions at
+    every other time step go to the slider-frames store, moving the slider only
+    moves the markers in the browser (see assets/slider-frames.js).
+    '''
     if data is None:
         return dash.no_update
     if add_rows_n_clicks > 0 and done_add_rows_n_clicks == 0:
         return dash.no_update
 
     if data == [] or encounter_id_selected is None or encounter_id_selected == [] or ac_ids_selected == []:
-        return 'Time:', 0, {}, {}, {}, {}, {}, {}, {}, 0, 100
+        return 0, {}, {}, {}, {}, {}, {}, {}, 0, 100, {}
     
     ctx = dash.callback_context.triggered[0]['prop_id'].split('.')[0]
-    if ctx == 'editable-table' or ctx == 'slider':
+    if ctx == 'editable-table':
 
         df = pd.DataFrame(data)        
         df_interp, min_values_list, max_values_list = interpolate_df_time(df, ac_ids_selected)
+
+        if min_values_list == [] and max_values_list == []:
+            return 0, {}, {}, {}, {}, {}, {}, {}, 0, 100, {}
+
+        min_values = np.min(np.array(min_values_list), axis=0)
+        max_values = np.max(np.array(max_values_list), axis=0)
         
-        if ctx == 'editable-table':
-            t_value = np.min(np.array(min_values_list), axis=0)[0]
+        t_value = float(min_values[0])
+        num_steps = int(max_values[0] - min_values[0]) + 1
+        # graph id -> marker traces of the graph, with the marker position at every slider step
+        frames = {'t_min': t_value, 'figures': collections.defaultdict(list)}
 
         # plot 2D/3D slider graphs
         fig_xy = px.line()
@@ -955,6 +1007,15 @@ def update_graphs_with_sliders(t_value, data, encounter_id_selected, ac_ids_sele
             fig_xyz.add_scatter3d(x=df_ac_interp['xEast'], y=df_ac_interp['yNorth'], z=df_ac_interp['zUp'],
                                mode='lines', marker={'color':COLOR_LIST[i]}, name='AC '+str(ac_id))
 
+            for graph_id, fig, columns in [('editable-graph-xy-slider', fig_xy, ['xEast', 'yNorth']),
+                                           ('editable-graph-tz-slider', fig_tz, ['time', 'zUp']),
+                                           ('editable-graph-tspeedxy-slider', fig_tspeedxy, ['time', 'horizontal_speed']),
+                                           ('editable-graph-tspeedz-slider', fig_tspeedz, ['time', 'vertical_speed']),
+                                           ('editable-graph-xyz-slider', fig_xyz, ['xEast', 'yNorth', 'zUp'])]:
+                frames['figures'][graph_id].append(dict({'trace': len(fig.data)}, 
+                                                        **{axis: slider_steps(df_ac_interp['time'], df_ac_interp[column], t_value, num_steps)
+                                                            for axis, column in zip(['x', 'y', 'z'], columns)}))
+
             df_ac_slider = df_ac_interp.loc[df_ac_interp['time'] == t_value]
             fig_xy.add_scatter(x=df_ac_slider['xEast'], y=df_ac_slider['yNorth'],
                                mode='markers', marker={'size':10, 'color':COLOR_LIST[i]}, showlegend=False)
@@ -979,6 +1040,12 @@ def update_graphs_with_sliders(t_value, data, encounter_id_selected, ac_ids_sele
             fig_tdistxy.add_scatter(x=df_dist['time'], y=df_dist['dist_xy'], mode='lines', marker={'color':'gray'}, showlegend=False)
             fig_tdistz.add_scatter(x=df_dist['time'], y=df_dist['dist_z'], mode='lines', marker={'color':'gray'}, showlegend=False)
 
+            for graph_id, fig, column in [('editable-graph-tdistxy-slider', fig_tdistxy, 'dist_xy'),
+                                          ('editable-graph-tdistz-slider', fig_tdistz, 'dist_z')]:
+                frames['figures'][graph_id].append({'trace': len(fig.data),
+                                                    'x': slider_steps(df_dist['time'], df_dist['time'], t_value, num_steps),
+                                                    'y': slider_steps(df_dist['time'], df_dist[column], t_value, num_steps)})
+
             df_dist_slider = df_dist.loc[df_dist['time'] == t_value]
             fig_tdistxy.add_scatter(x=df_dist_slider['time'], y=df_dist_slider['dist_xy'], 
                                     mode='markers', marker={'size':10, 'color':'gray'}, showlegend=False)
@@ -986,12 +1053,6 @@ def update_graphs_with_sliders(t_value, data, encounter_id_selected, ac_ids_sele
                                     mode='markers', marker={'size':10, 'color':'gray'}, showlegend=False)  
 
         # update layout of graphs
-        if min_values_list == [] and max_values_list == []:
-            return 'Time: ', 0, {}, {}, {}, {}, {}, {}, {}, 0, 100
-
-        min_values = np.min(np.array(min_values_list), axis=0)
-        max_values = np.max(np.array(max_values_list), axis=0)
-
         margin = dict(l=50, r=20, b=50, t=20, pad=0)
     
         fig_xy.update_layout(# title_font_family="Times New Roman",
@@ -1031,7 +1092,16 @@ def update_graphs_with_sliders(t_value, data, encounter_id_selected, ac_ids_sele
             yaxis_title = 'Distance (ft)',
             margin=margin)
 
-        return 'Time: {}s'.format(t_value), t_value, fig_xy, fig_tz, fig_tspeedxy, fig_tspeedz, fig_xyz, fig_tdistxy, fig_tdistz, min_values[0], max_values[0]
+        return t_value, fig_xy, fig_tz, fig_tspeedxy, fig_tspeedz, fig_xyz, fig_tdistxy, fig_tdistz, min_values[0], max_values[0], frames
+
+    return dash.no_update
+
+
+app.clientside_callback(
+    ClientsideFunction(namespace='slider', function_name='move_markers'),
+    Output('slider-drag-output', 'children'),
+    Input('slider', 'value'),
+    Input('slider-frames', 'data'))
 
 
 ###########################################################################################
@@ -1115,49 +1185,40 @@ def update_data_table(upload_n_clicks, encounter_id_selected, ac_ids_selected, u
             or not ref_data['ref_alt'] or not interval or not zUp_input:
                 return dash.no_update, dash.no_update
         
-        df = pd.DataFrame(table_data)
-        if 'ac_id' not in df.keys() or (len(df.loc[df['ac_id'] == ac_value]) != len(current_markers)):
+        ac_rows = [i for i, data_point in enumerate(table_data) if data_point.get('ac_id') == ac_value]
+        if len(ac_rows) != len(current_markers):
             timestep = 0
-
-            if 'ac_id' in df.keys():
-                if ac_value in df['ac_id'].tolist():
-                    df_ac = df.loc[df['ac_id'] == ac_value]
-                    last_timestep = max(df_ac['time'])
-                    timestep = last_timestep+interval
+            if ac_rows:
+                last_timestep = max(table_data[i]['time'] for i in ac_rows)
+                timestep = last_timestep+interval
                 
             # in creative mode and user has created another marker 
             # we add each marker to the data as it is created 
             # so we only have to grab last marker in the list
             pos = current_markers[-1]['props']['position']
-            xEast, yNorth, _ = pm.geodetic2enu(pos[0], pos[1], zUp_input*FT_TO_M, 
-                                                    ref_data['ref_lat'], ref_data['ref_long'], ref_data['ref_alt']*FT_TO_M,
-                                                    ell=pm.Ellipsoid('wgs84'), deg=True)
+            xEast, yNorth, _ = geodetic_to_enu(pos[0], pos[1], zUp_input, ref_data)
             marker_dict = {'encounter_id': 0, 'ac_id': ac_value, 'time': timestep, 
-                            'xEast': xEast*M_TO_NM, 'yNorth': yNorth*M_TO_NM,
+                            'xEast': float(xEast), 'yNorth': float(yNorth),
                             'lat':pos[0], 'long':pos[1], 'zUp': zUp_input,
                             'heading': 0, 'turn_rate': 0, 'horizontal_speed': 0, 'vertical_speed': 0}
             table_data.append(marker_dict)
+            update_waypoint_kinematics(table_data, [len(table_data)-1])
         else:
             # an already existing marker was dragged
             # and therefore its position in data table needs to get updated
 
-            df = pd.DataFrame(table_data)
-
-            waypoint = 0
-            for i, data_point in df.iterrows():
-                if data_point['ac_id'] == ac_value:
-                    pos = current_markers[waypoint]['props']['position']
-                    xEast, yNorth, zUp = pm.geodetic2enu(pos[0], pos[1], zUp_input*FT_TO_M, 
-                                                            ref_data['ref_lat'], ref_data['ref_long'], ref_data['ref_alt']*FT_TO_M,
-                                                            ell=pm.Ellipsoid('wgs84'), deg=True)
-                    data_point['xEast'] = xEast*M_TO_NM
-                    data_point['yNorth'] = yNorth*M_TO_NM
-                    data_point['lat'] = pos[0]
-                    data_point['long'] = pos[1]
-                    df.at[i] = data_point
-                    waypoint += 1
+            # markers of the aircraft are in the order of its rows, only the moved ones are projected
+            positions = np.array([marker['props']['position'] for marker in current_markers], dtype=float).reshape(-1, 2)
+            row_positions = np.array([[table_data[i]['lat'], table_data[i]['long']] for i in ac_rows], dtype=float).reshape(-1, 2)
+            moved = np.flatnonzero(np.any(positions != row_positions, axis=1))
+            if len(moved) == 0:
+                return dash.no_update, dash.no_update
 
-            table_data = df.to_dict('records')
+            xEast, yNorth, _ = geodetic_to_enu(positions[moved, 0], positions[moved, 1], zUp_input, ref_data)
+            for marker, marker_xEast, marker_yNorth in zip(moved, xEast.tolist(), yNorth.tolist()):
+                table_data[ac_rows[marker]].update({'xEast': marker_xEast, 'yNorth': marker_yNorth,
+                                                    'lat': positions[marker, 0].item(), 'long': positions[marker, 1].item()})
+            update_waypoint_kinematics(table_data, [ac_rows[marker] for marker in moved])
 
         return table_data, columns
         
@@ -1528,12 +1589,8 @@ def update_map(data, ref_data, current_polylines):
         data_group = [x for x in aggregation.values()]
             
         for data_id in data_group:
-            lat_lng_dict = []
-            for i in range(len(data_id['xEast'])):
-                lat, lng, alt = pm.enu2geodetic(data_id['xEast'][i]*NM_TO_M, data_id['yNorth'][i]*NM_TO_M, data_id['zUp'][i]*FT_TO_M, 
-                                                ref_data['ref_lat'], ref_data['ref_long'], ref_data['ref_alt']*FT_TO_M, 
-                                                ell=pm.Ellipsoid('wgs84'), deg=True)
-                lat_lng_dict.append([lat, lng])
+            lat, lng, _ = enu_to_geodetic(data_id['xEast'], data_id['yNorth'], data_id['zUp'], ref_data)
+            lat_lng_dict = np.column_stack((lat, lng)).tolist()
             
             new_polylines.append(dl.PolylineDecorator(positions=lat_lng_dict, patterns=map_patterns))
         
@@ -1810,7 +1867,8 @@ def reset_gen_modal_nominal_dropdown_values(gen_n_clicks, contents, ac_options):
                 Output('exp-kernel-input-a', 'value'),
                 Output('exp-kernel-input-b', 'value'),
                 Output('exp-kernel-input-c', 'value'),
-                Output('num-encounters-input', 'value')],
+                Output('num-encounters-input', 'value'),
+                Output('generation-seed-input', 'value')],
                 Input('load-model', 'contents'))
 def gen_modal_load_in_model(contents):
     ## TODO: Add 'coord-radio' to the output.
@@ -1820,17 +1878,18 @@ def gen_modal_load_in_model(contents):
         
         if 'json' in content_type:
             model = json.loads(base64.b64decode(content_string))
+            seed = model.get('seed')
 
             cov = model['covariance']
             if cov['type'] == 'diagonal':
                 if 'sigma_hor' in cov.keys() and 'sigma_ver' in cov.keys():
-                    return 'cov-radio-diag', cov['sigma_hor'], cov['sigma_ver'], None, None, None, None
+                    return 'cov-radio-diag', cov['sigma_hor'], cov['sigma_ver'], None, None, None, None, seed
 
             elif cov['type'] == 'exponential kernel':
                 if 'a' in cov.keys() and 'b' in cov.keys() and 'c' in cov.keys():
-                    return 'cov-radio-exp', None, None, cov['a'], cov['b'], cov['c'], None
+                    return 'cov-radio-exp', None, None, cov['a'], cov['b'], cov['c'], None, seed
 
-    return dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update
+    return dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update
 
 
 @app.callback(Output('popover-content', 'children'),
@@ -1932,8 +1991,12 @@ def toggle_gen_modal(gen_n_clicks, close_n_clicks, generate_n_clicks):
     return dash.no_update
 
 
-@app.callback(Output('generated-data', 'data'),
-              Input('generate-button', 'n_clicks'),
+@app.callback([Output('generated-data', 'data'),
+               Output('generation-job', 'data'),
+               Output('generation-job-interval', 'disabled')],
+              [Input('generate-button', 'n_clicks'),
+               Input('generation-job-interval', 'n_intervals'),
+               Input('cancel-job-button', 'n_clicks')],
               [State('coord-radio', 'value'),  ## Added
                State('nominal-path-enc-ids', 'value'),
                State('nominal-path-ac-ids', 'value'),
@@ -1944,10 +2007,17 @@ def toggle_gen_modal(gen_n_clicks, close_n_clicks, generate_n_clicks):
                State('exp-kernel-input-b', 'value'),
                State('exp-kernel-input-c', 'value'),
                State('num-encounters-input', 'value'),
+               State('generation-seed-input', 'value'),
                State('ref-data', 'data'),
-               State('memory-data', 'data')])
-def generate_encounters(gen_n_clicks, coord_radio_value, nom_enc_id, nom_ac_ids, cov_radio_value, sigma_hor, sigma_ver, exp_kernel_a, exp_kernel_b,\
-                        exp_kernel_c, num_encounters, ref_data, memory_data): 
+               State('memory-data', 'data'),
+               State('generation-job', 'data'),
+               State('metrics-job', 'data')])
+def generate_encounters(gen_n_clicks, n_intervals, cancel_n_clicks, coord_radio_value, nom_enc_id, nom_ac_ids, cov_radio_value, sigma_hor, sigma_ver, 
+                        exp_kernel_a, exp_kernel_b, exp_kernel_c, num_encounters, generation_seed, ref_data, memory_data, generation_job, metrics_job): 
+    '''
+    Starts generating an encounter set as a background job when the generate button is clicked,
+    then polls the job every JOB_POLL_INTERVAL ms and fills generated-data.data once it is done.
+    '''
 
     ctx = dash.callback_context.triggered[0]['prop_id'].split('.')[0]
 
@@ -1956,15 +2026,21 @@ def generate_encounters(gen_n_clicks, coord_radio_value, nom_enc_id, nom_ac_ids,
         if gen_n_clicks > 0:
             print('\n--GENERATING ENCOUNTERS--\n')
 
-            start = time.time()
             file_path = DEFAULT_DATA_FILE_PATH
             
             # error checking
             if generation_error_found(memory_data['type'], nom_ac_ids, num_encounters, cov_radio_value, 
                                         sigma_hor, sigma_ver, exp_kernel_a, exp_kernel_b, exp_kernel_c):
-                return {}
+                return {}, dash.no_update, dash.no_update
+
+            if generation_job:
+                print('An encounter set is already being generated.')
+                return dash.no_update, dash.no_update, dash.no_update
 
             nom_enc_data = parse_enc_data(memory_data, [nom_enc_id], nom_ac_ids, ref_data, file_path)
+            if not nom_enc_data:
+                print('Nominal encounter', nom_enc_id, 'is no longer available, load or create it again before generating')
+                return dash.no_update, dash.no_update, dash.no_update
 
             df = pd.DataFrame(nom_enc_data)
             
@@ -1982,104 +2058,83 @@ def generate_encounters(gen_n_clicks, coord_radio_value, nom_enc_id, nom_ac_ids,
             ac_times = [ [waypoint['time'] for waypoint in (df.loc[df['ac_id'] == ac]).to_dict('records')] for ac in nom_ac_ids]
 
 
-            if cov_radio_value == 'cov-radio-diag':
-                cov = [ [sigma_hor, 0, 0], 
-                        [0, sigma_hor, 0], 
-                        [0, 0, sigma_ver] ]
- 
-                # generate waypoints
-                generated_waypoints = np.array([ [np.random.multivariate_normal(mean,cov,num_encounters) for mean in ac] for ac in kernel_inputs])
-                generated_waypoints[0] = np.moveaxis(generated_waypoints[0], 0, 1)
-                generated_waypoints[1] = np.moveaxis(generated_waypoints[1], 0, 1)
-
-                # include nominal encounter
-                generated_waypoints[0] = np.array([kernel_inputs[0]] + generated_waypoints[0].tolist())
-                generated_waypoints[1] = np.array([kernel_inputs[1]] + generated_waypoints[1].tolist())
-
-            elif cov_radio_value == 'cov-radio-exp':  
-                generated_waypoints = np.empty([len(kernel_inputs),], dtype=object)
-                for ac_id, ac_kernel_inputs in enumerate(kernel_inputs):
-                    mean, cov = exp_kernel_func(ac_kernel_inputs, exp_kernel_a, exp_kernel_b, exp_kernel_c)
-                    
-                    # generate waypoints
-                    generated_waypoints[ac_id] = np.random.multivariate_normal(mean,cov,num_encounters)
-                    generated_waypoints[ac_id] = np.reshape(generated_waypoints[ac_id], (generated_waypoints[ac_id].shape[0], -1, 3))
-                    
-                    # include nominal encounter
-                    generated_waypoints[ac_id] = np.array([kernel_inputs[ac_id]] + generated_waypoints[ac_id].tolist())
-            print(f'finished generating encounters in {(time.time()-start)/60:.6f} mins.\n')
-            
-            start = time.time()
-            generated_data_filename = file_path + 'generated_data.dat'
-            enc_data_indices, minmax_hist = stream_generated_data(generated_waypoints, ac_times, generated_data_filename, num_encounters)
-            print(f'finished streaming generated data in {(time.time()-start)/60:.6f} mins.\n')
-
-            return {'filename':generated_data_filename,
-                    'encounter_indices':enc_data_indices,
-                    'minmax_hist':minmax_hist,
-                    'ac_ids':nom_ac_ids,
-                    'num_encounters': num_encounters+1, #include nominal path
-                    'type':'generated'}
+            seed = int(generation_seed) if generation_seed is not None else new_generation_seed()
+            print('generating with seed', seed)
 
-    return dash.no_update
+            samplers = [create_ac_sampler(ac_kernel_inputs, cov_radio_value, sigma_hor, sigma_ver, exp_kernel_a, exp_kernel_b, exp_kernel_c) 
+                            for ac_kernel_inputs in kernel_inputs]
+
+            # encounters are sampled in parallel shards, encoded, counted and written to disk one chunk at a time
+            minmax_hist = generation_minmax_hist(samplers, ac_times)
+            # every generation gets its own workspace file, concurrent sessions never share one
+            generated_data_filename = new_workspace_filename('generated')
+            job_id = submit_job('generation', run_generation_job, samplers, kernel_inputs, ac_times, file_path, generated_data_filename, num_encounters,
+                                minmax_hist, seed, nom_ac_ids)
+
+            return dash.no_update, {'job_id': job_id}, False
+
+    elif ctx == 'cancel-job-button':
+        # only the job shown in the status bar is cancelled
+        if cancel_n_clicks > 0 and generation_job and shown_job(generation_job, metrics_job)[0] == generation_job:
+            cancel_job(generation_job['job_id'])
+
+    elif ctx == 'generation-job-interval':
+        if generation_job:
+            status = read_job_status(generation_job['job_id'])
+            if status is None or status['state'] in JOB_FINISHED_STATES:
+                remove_job(generation_job['job_id'])
+
+                if status is not None and status['state'] == JOB_DONE:
+                    return status['result'], {}, True
+                if status is not None and status['state'] == JOB_FAILED:
+                    print('Generation failed:', status['error'])
+                return dash.no_update, {}, True
+
+    return dash.no_update, dash.no_update, dash.no_update
 
 
 
 ###########################################################################################
 # HISTOGRAM CALLBACKS #
 ###########################################################################################
-@app.callback([Output('log-histogram-ac-1-xy', 'figure'),
-              Output('log-histogram-ac-1-tz', 'figure'),
-              Output('log-histogram-ac-2-xy', 'figure'),
-              Output('log-histogram-ac-2-tz', 'figure')],
+@app.callback(Output('histogram-container', 'children'),
               Input('generated-data', 'data'))
 def on_generation_update_log_histograms(generated_data):
+    if not generated_data:
+        return dash.no_update
+
     print('\n--CREATING HISTOGRAMS--\n')
     start = time.time()
 
-    generated_data_filename = generated_data['filename']
-    enc_indices = generated_data['encounter_indices']
+    generated_data_filename = DEFAULT_DATA_FILE_PATH + generated_data['filename']
+    dataset = get_dataset(generated_data, DEFAULT_DATA_FILE_PATH)
+    if dataset is None:
+        return dash.no_update
     minmax_hist = generated_data['minmax_hist']
     ac_ids = generated_data['ac_ids']
     num_encounters = generated_data['num_encounters']
 
-    ac_1_xy_bin_counts, ac_1_tz_bin_counts, ac_2_xy_bin_counts, ac_2_tz_bin_counts,\
-        ac1_t_edges, ac1_x_edges, ac1_y_edges, ac1_z_edges,\
-        ac2_t_edges, ac2_x_edges, ac2_y_edges, ac2_z_edges = stream_count_histograms(generated_data_filename, \
-        enc_indices, minmax_hist, num_encounters, ac_ids)
-    
-    bin_counts = [ac_1_xy_bin_counts, ac_1_tz_bin_counts, ac_2_xy_bin_counts, ac_2_tz_bin_counts]
-    x_labels = ['xEast', 'time','xEast', 'time']
-    y_labels = ['yNorth', 'zUp', 'yNorth', 'zUp']
-    x_axes = [ac1_x_edges, ac1_t_edges, ac2_x_edges, ac2_t_edges]
-    y_axes = [ac1_y_edges, ac1_z_edges, ac2_y_edges, ac2_z_edges]
-
-    num_processes = mp.cpu_count()
-    pool = mp.Pool(num_processes)
-
-    histograms = pool.starmap(create_histogram, zip(bin_counts, x_labels, y_labels, x_axes, y_axes))
+    # histograms are counted during generation, the file is only read
+    # back if they have been evicted from the dataset registry since
+    hist_outputs = dataset['histograms']
+    if hist_outputs is None:
+        hist_outputs = stream_count_histograms(generated_data_filename, dataset['encounter_indices'], minmax_hist, num_encounters, ac_ids)
+
+    bin_counts, x_labels, y_labels, x_axes, y_axes, titles = [], [], [], [], [], []
+    for ac_id, (xy_bin_counts, tz_bin_counts, t_edges, x_edges, y_edges, z_edges) in zip(ac_ids, hist_outputs):
+        bin_counts += [xy_bin_counts, tz_bin_counts]
+        x_labels += ['xEast', 'time']
+        y_labels += ['yNorth', 'zUp']
+        x_axes += [x_edges, t_edges]
+        y_axes += [y_edges, z_edges]
+        titles += [f'AC {ac_id}: xEast vs. yNorth', f'AC {ac_id}: Time vs. zUp']
+
+    # building a figure from counted bins is cheap, shipping the bins to the process
+    # pool and the figures back costs more than it saves
+    histograms = [create_histogram(*args) for args in zip(bin_counts, x_labels, y_labels, x_axes, y_axes)]
     print(f'finished plotting histograms in {(time.time()-start)/60:.6f} mins.\n')
 
-    pool.close()
-    pool.join()
-    return histograms
-
-
-def create_histogram(bin_counts, x_label, y_label, x_axes, y_axes):
-    if x_label == 'xEast' and y_label == 'yNorth':
-        return {
-            'data': [go.Heatmap(z=bin_counts, x=x_axes, y=y_axes, 
-                                colorscale=[[0,'#2c3e50'], 
-                                            [1,'#ffffff']])],
-            'layout': go.Layout(xaxis_title="xEast (NM)", yaxis_title="yNorth (NM)")
-        }
-    if x_label == 'time' and y_label == 'zUp':
-        return {
-            'data': [go.Heatmap(z=bin_counts, x=x_axes, y=y_axes,
-                                colorscale=[[0,'#2c3e50'], 
-                                            [1,'#ffffff']])],
-            'layout': go.Layout(xaxis_title="Time (s)", yaxis_title="zUp (ft)")
-        }
+    return [histogram_card(title, histogram) for title, histogram in zip(titles, histograms)]
 
 
 @app.callback(Output('tab-4-graphs','style'),
@@ -2111,47 +2166,134 @@ def disable_switch(gen_data):
 
 
 
+###########################################################################################
+# ENCOUNTER METRICS CALLBACKS #
+###########################################################################################
+@app.callback([Output('metrics-data', 'data'),
+               Output('metrics-job', 'data'),
+               Output('metrics-job-interval', 'disabled')],
+              [Input('compute-metrics-button', 'n_clicks'),
+               Input('metrics-job-interval', 'n_intervals'),
+               Input('cancel-job-button', 'n_clicks')],
+              [State('memory-data', 'data'),
+               State('generation-job', 'data'),
+               State('metrics-job', 'data')])
+def compute_encounter_metrics(compute_n_clicks, n_intervals, cancel_n_clicks, memory_data, generation_job, metrics_job):
+    '''
+    Starts computing the CPA metrics of every encounter of the loaded or generated set as a background
+    job when the compute metrics button is clicked, then polls the job every JOB_POLL_INTERVAL ms and
+    fills metrics-data.data once it is done.
+    '''
+    file_path = DEFAULT_DATA_FILE_PATH
+
+    ctx = dash.callback_context.triggered[0]['prop_id'].split('.')[0]
+
+    if ctx == 'compute-metrics-button':
+        if compute_n_clicks > 0:
+            if metrics_job:
+                print('Encounter metrics are already being computed.')
+                return dash.no_update, dash.no_update, dash.no_update
+
+            if not memory_data or (memory_data['type'] != 'loaded' and memory_data['type'] != 'generated'):
+                print('Must load or generate a waypoint file to compute encounter metrics')
+                return dash.no_update, dash.no_update, dash.no_update
+            if len(memory_data['ac_ids']) < 2:
+                print('Encounter metrics need at least two aircraft')
+                return dash.no_update, dash.no_update, dash.no_update
+
+            dataset = get_dataset(memory_data, file_path)
+            if dataset is None:
+                return dash.no_update, dash.no_update, dash.no_update
+
+            print('\n--COMPUTING ENCOUNTER METRICS--\n')
+            metrics_filename = new_workspace_filename('cpa_metrics', extension='.npy')
+            job_id = submit_job('metrics', run_cpa_metrics_job, file_path, memory_data['filename'], dataset['encounter_indices'],
+                                valid_encounter_ids(memory_data), memory_data['ac_ids'], metrics_filename)
+
+            return dash.no_update, {'job_id': job_id}, False
+
+    elif ctx == 'cancel-job-button':
+        # only the job shown in the status bar is cancelled
+        if cancel_n_clicks > 0 and metrics_job and shown_job(generation_job, metrics_job)[0] == metrics_job:
+            cancel_job(metrics_job['job_id'])
+
+    elif ctx == 'metrics-job-interval':
+        if metrics_job:
+            status = read_job_status(metrics_job['job_id'])
+            if status is None or status['state'] in JOB_FINISHED_STATES:
+                remove_job(metrics_job['job_id'])
+
+                if status is not None and status['state'] == JOB_DONE:
+                    return status['result'], {}, True
+                if status is not None and status['state'] == JOB_FAILED:
+                    print('Computing encounter metrics failed:', status['error'])
+                return dash.no_update, {}, True
+
+    return dash.no_update, dash.no_update, dash.no_update
+
+
+@app.callback([Output('metrics-table', 'data'),
+               Output('metrics-table', 'page_count'),
+               Output('metrics-summary', 'children')],
+              [Input('metrics-data', 'data'),
+               Input('metrics-table', 'page_current'),
+               Input('metrics-table', 'page_size'),
+               Input('metrics-table', 'sort_by'),
+               Input('metrics-table', 'filter_query')])
+def update_metrics_table(metrics_data, page_current, page_size, sort_by, filter_query):
+    '''
+    Fills metrics-table with the page page_current of the encounter metrics matching filter_query,
+    sorted by sort_by. Only that page is sent to the browser.
+    '''
+    if not metrics_data:
+        return [], 0, ''
+
+    metrics_filepath = DEFAULT_DATA_FILE_PATH + metrics_data['filename']
+    if not os.path.exists(metrics_filepath):
+        print('Encounter metrics', metrics_filepath, 'no longer exist, compute them again.')
+        return [], 0, ''
+
+    metrics = query_cpa_metrics(metrics_filepath, filter_query, sort_by)
+    page = metrics.iloc[page_current*page_size:(page_current+1)*page_size]
+
+    summary = f"{os.path.basename(metrics_data['source_filename'])}: {metrics_data['num_nmacs']} NMACs in {metrics_data['num_encounters']} encounters, {len(metrics)} shown"
+    return page.astype(object).where(page.notna(), None).to_dict('records'), max(-(-len(metrics) // page_size), 1), summary
+
+
+
 ###########################################################################################
 # SAVE MODAL CALLBACKS #
 ###########################################################################################
-@app.callback(Output('download-waypoints', 'data'),
+@app.callback(Output('download-waypoints', 'src'),
                 Input('save-filename-button', 'n_clicks'),
-                [State('nominal-path-ac-ids', 'options'),
-                State('save-dat-filename', 'value'),
+                [State('save-dat-filename', 'value'),
                 State('file-checklist', 'value'),
                 State('dat-file-units', 'value'),
                 State('memory-data', 'data'),
-               State('load-waypoints', 'contents'),
-               State('load-waypoints', 'filename'),
                State('generated-data', 'data'),
                State('ref-data', 'data'),
                State('editable-table', 'data'),
                State('load-model', 'contents')],
                 prevent_initial_call=True)
-def on_click_save_dat_file(save_n_clicks, nom_ac_ids, dat_filename, files_to_save, dat_file_units, memory_data,\
-                            waypoints_contents, loaded_filename, generated_data, ref_data, table_data, model_contents): 
+def on_click_save_dat_file(save_n_clicks, dat_filename, files_to_save, dat_file_units, memory_data,\
+                            generated_data, ref_data, table_data, model_contents): 
     
     file_path = DEFAULT_DATA_FILE_PATH
 
     if save_n_clicks > 0:
-        if generated_data != {} and 'dat-item' in files_to_save:
+        if generated_data != {} and files_to_save and 'dat-item' in files_to_save:
 
             if dat_file_units == 'dat-units-geo':
                 print("UNSUPPORTED OPTION")
 
-            generated_data_filename = generated_data['filename']
-            enc_indices = generated_data['encounter_indices']
-            num_enc = generated_data['num_encounters']
-            file_name = dat_filename if dat_filename else 'generated_waypoints.dat'
+            dataset = get_dataset(generated_data, file_path)
+            if dataset is None:
+                return dash.no_update
 
-            with open(file_path + file_name, 'wb') as file_to_save, open(file_path + generated_data_filename, 'rb') as gen_file:
-                encounters_data = gen_file.read()
-                data_to_save = bytearray()
-                data_to_save.extend(struct.pack('<II', num_enc-1, len(nom_ac_ids))) # remove nominal encounter
-                data_to_save.extend(encounters_data[enc_indices[1]:])
-                file_to_save.write(data_to_save)
+            file_name = dat_filename if dat_filename else 'generated_waypoints.dat'
 
-            return dcc.send_file(file_path + file_name)
+            # remove nominal encounter, the rest of the file is streamed as is after a new header
+            return create_generated_export(generated_data, dataset['encounter_indices'], file_path, file_name)
         else:
             print('Must generate an encounter set')
 
@@ -2211,6 +2353,9 @@ def on_click_save_json_file(save_n_clicks, generated_data, cov_radio_val, sigma_
                         'c': c,
                     }
 
+                if 'seed' in generated_data:
+                    model_json['seed'] = generated_data['seed']
+
                 file_name = json_filename if json_filename else 'generation_model.json'
                 with open(file_path + file_name, 'w') as outfile:
                     json.dump(model_json, outfile, indent=4)
@@ -2222,6 +2367,27 @@ def on_click_save_json_file(save_n_clicks, generated_data, cov_radio_val, sigma_
     return dash.no_update
 
 
+###########################################################################################
+# JOB STATUS CALLBACKS #
+###########################################################################################
+@app.callback([Output('job-progress', 'value'),
+               Output('job-progress', 'label'),
+               Output('job-status', 'children'),
+               Output('job-status-div', 'style')],
+              [Input('generation-job-interval', 'n_intervals'),
+               Input('generation-job', 'data'),
+               Input('metrics-job-interval', 'n_intervals'),
+               Input('metrics-job', 'data')])
+def update_job_status(generation_n_intervals, generation_job, metrics_n_intervals, metrics_job):
+    _, status = shown_job(generation_job, metrics_job)
+    if status is not None:
+        progress = status['progress']
+        message = status['message'] if status['message'] else status['state'].capitalize()
+        return progress, f'{progress:.0f}%', message, {'display':'block'}
+
+    return 0, '', '', {'display':'none'}
+
+
 @app.callback([Output('save-dat-div','style'),
                 Output('save-json-div', 'style')],
                 Input('file-checklist', 'value'))
@@ -5,9 +5,15 @@
 
 import index
 import warnings
+
+from helpers.executor_helpers import *
 warnings.filterwarnings("ignore")
 
 
 if __name__ == '__main__':
     print("\n---START OF CODE---\n")
-    index.app.run_server(debug=True)
\ No newline at end of file
+    init_executor(EXECUTOR_KIND, EXECUTOR_MAX_WORKERS)
+    try:
+        index.app.run_server(debug=True)
+    finally:
+        shutdown_executor()
\ No newline at end of file
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the app imports its modules as helpers.<module>, relative to contrail/scr
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'scr'))
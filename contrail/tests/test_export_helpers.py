@@ -0,0 +1,54 @@
+import json
+import struct
+
+import numpy as np
+import pytest
+
+pytest.importorskip('flask')
+
+from helpers import export_helpers
+from helpers.export_helpers import create_generated_export, export_spec_filepath, iter_export_bytes
+from helpers.encounter_file_helpers import get_encounter_file
+from helpers.encounter_index_helpers import load_or_build_encounter_index
+from helpers.dataset_registry_helpers import encounter_indices_from_offsets
+from helpers.parse_encounter_helpers import decode_encounter
+
+
+def encounter_block(rng, num_ac, num_updates):
+    block = b''.join(struct.pack('<ddd', *rng.normal(size=3)) for _ in range(num_ac))
+    for _ in range(num_ac):
+        block += struct.pack('<H', num_updates)
+        block += b''.join(struct.pack('<dddd', t, *rng.normal(size=3)) for t in range(1, num_updates+1))
+    return block
+
+
+def test_export_of_aircraft_subset_has_generated_num_ac(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_helpers, 'EXPORT_DIRECTORY', str(tmp_path / 'exports'))
+
+    # a set generated from aircraft 1 and 3 of a three aircraft encounter: nominal plus 4 encounters
+    rng = np.random.default_rng(0)
+    generated_ac_ids, num_encounters = [1, 3], 5
+    blocks = [encounter_block(rng, len(generated_ac_ids), num_updates) for num_updates in [3, 3, 4, 2, 3]]
+    with open(tmp_path / 'generated.dat', 'wb') as file:
+        file.write(struct.pack('<II', num_encounters, len(generated_ac_ids)) + b''.join(blocks))
+
+    offsets, _, _ = load_or_build_encounter_index(str(tmp_path / 'generated.dat'))
+    generated_data = {'filename': 'generated.dat', 'num_encounters': num_encounters, 'ac_ids': generated_ac_ids}
+    url = create_generated_export(generated_data, encounter_indices_from_offsets(offsets, 'generated'), f'{tmp_path}/', 'subset.dat')
+
+    with open(export_spec_filepath(url.split('/')[-1])) as file:
+        spec = json.load(file)
+    with open(tmp_path / 'subset.dat', 'wb') as file:
+        for data in iter_export_bytes(spec):
+            file.write(data)
+
+    export_offsets, num_ac, num_enc = load_or_build_encounter_index(str(tmp_path / 'subset.dat'))
+    assert (num_enc, num_ac) == (num_encounters-1, len(generated_ac_ids))
+    assert export_offsets[-1] == (tmp_path / 'subset.dat').stat().st_size
+
+    exported, generated = get_encounter_file(str(tmp_path / 'subset.dat')), get_encounter_file(str(tmp_path / 'generated.dat'))
+    for enc_id in range(num_enc):
+        exported_columns = decode_encounter(exported.encounter(enc_id, export_offsets), generated_ac_ids)
+        generated_columns = decode_encounter(generated.encounter(enc_id+1, offsets), generated_ac_ids)
+        for key in ['ac_id', 'time', 'xEast', 'yNorth', 'zUp']:
+            np.testing.assert_array_equal(exported_columns[key], generated_columns[key])
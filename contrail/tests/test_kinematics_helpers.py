@@ -0,0 +1,42 @@
+import struct
+
+import numpy as np
+import pandas as pd
+
+from helpers.kinematics_helpers import KINEMATICS_KEYS, iter_encounter_kinematics_chunks
+from helpers.encounter_index_helpers import load_or_build_encounter_index
+from helpers.dataset_registry_helpers import encounter_indices_from_offsets
+from helpers.waypoint_helpers import calculate_turnrate_hor_ver_speeds_df
+
+
+def encounter_block(rng, num_updates):
+    block = b''.join(struct.pack('<ddd', *rng.normal(scale=1000., size=3)) for _ in num_updates)
+    for ac_num_updates in num_updates:
+        block += struct.pack('<H', ac_num_updates)
+        times = np.cumsum(rng.uniform(.5, 4., size=ac_num_updates))
+        block += b''.join(struct.pack('<dddd', t, *rng.normal(scale=1000., size=3)) for t in times)
+    return block
+
+
+def test_bulk_kinematics_match_waypoints_table(tmp_path):
+    # ragged encounters, so that the chunks are decoded encounter by encounter
+    rng = np.random.default_rng(0)
+    num_updates = [[3, 1], [0, 5], [2, 2], [6, 3], [4, 0]]
+    with open(tmp_path / 'kinematics.dat', 'wb') as file:
+        file.write(struct.pack('<II', len(num_updates), 2) + b''.join(encounter_block(rng, enc_num_updates) for enc_num_updates in num_updates))
+
+    offsets, num_ac, num_enc = load_or_build_encounter_index(str(tmp_path / 'kinematics.dat'))
+    enc_indices = encounter_indices_from_offsets(offsets, 'loaded')
+
+    num_chunks = 0
+    for chunk in iter_encounter_kinematics_chunks(str(tmp_path / 'kinematics.dat'), enc_indices, range(1, num_enc+1), num_ac, chunk_size=2):
+        num_chunks += 1
+        # one waypoints table aircraft per resampled trajectory, headings from xEast/yNorth
+        df = pd.DataFrame({'ac_id': chunk['encounter_id'] * num_ac + chunk['ac'], 'time': chunk['time'],
+                           'xEast': chunk['xEast'], 'yNorth': chunk['yNorth'], 'zUp': chunk['zUp'],
+                           'lat': chunk['yNorth'], 'long': chunk['xEast']})
+        expected = calculate_turnrate_hor_ver_speeds_df(df)
+        for key in KINEMATICS_KEYS:
+            np.testing.assert_allclose(np.round(chunk[key], 4), expected[key].to_numpy(), atol=1e-9)
+
+    assert num_chunks == 3
@@ -0,0 +1,50 @@
+import numpy as np
+
+from scipy.interpolate import PchipInterpolator
+
+from helpers.resample_helpers import pchip_slopes, resample_pchip
+
+
+def ragged_trajectories(rng, lengths):
+    times, values = [], []
+    for length in lengths:
+        times.append(rng.uniform(-3., 40.) + np.cumsum(rng.uniform(.3, 6., size=length)))
+        trajectory_values = rng.normal(size=(length, 3))
+        # plateaus and repeated values exercise the zero slope cases
+        trajectory_values[length//2:, 2] = trajectory_values[length//2, 2]
+        values.append(np.round(trajectory_values, 1))
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    return np.concatenate(times), np.concatenate(values), offsets
+
+
+def test_pchip_matches_scipy_on_ragged_trajectories():
+    rng = np.random.default_rng(0)
+    lengths = rng.permutation(np.repeat(np.arange(2, 9), 3))
+    times, values, offsets = ragged_trajectories(rng, lengths)
+
+    slopes = pchip_slopes(times, values, offsets)
+    grid_offsets, grid_times, grid_values = resample_pchip(times, values, offsets, time_step=.5)
+    assert len(grid_offsets) == len(offsets)
+
+    for k in range(len(lengths)):
+        trajectory = slice(offsets[k], offsets[k+1])
+        interpolator = PchipInterpolator(times[trajectory], values[trajectory])
+        np.testing.assert_allclose(slopes[trajectory], interpolator.derivative()(times[trajectory]), rtol=1e-9, atol=1e-12)
+
+        grid = slice(grid_offsets[k], grid_offsets[k+1])
+        expected_times = np.arange(np.trunc(times[trajectory][0] / .5), np.trunc(times[trajectory][-1] / .5) + 1) * .5
+        np.testing.assert_allclose(grid_times[grid], expected_times)
+        np.testing.assert_allclose(grid_values[grid], interpolator(expected_times), rtol=1e-9, atol=1e-12)
+
+
+def test_single_waypoint_trajectories_are_constant():
+    times = np.array([2.5, 0., 1.5, 3.2, 7.9])
+    values = np.arange(15, dtype=float).reshape(5, 3)
+    offsets = np.array([0, 1, 4, 5])
+
+    grid_offsets, grid_times, grid_values = resample_pchip(times, values, offsets)
+
+    np.testing.assert_array_equal(grid_offsets, [0, 1, 5, 6])
+    np.testing.assert_array_equal(grid_times[[0, 5]], [2., 7.])
+    np.testing.assert_array_equal(grid_values[[0, 5]], values[[0, 4]])
+    np.testing.assert_allclose(grid_values[1:5], PchipInterpolator(times[1:4], values[1:4])(grid_times[1:5]))